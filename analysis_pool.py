@@ -0,0 +1,175 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+import numpy as np
+import pandas as pd
+from indicator_state import STATE_PATH, load_state, save_state, update_indicators
+from indicators import compute_indicators
+from kline_store import ARCHIVE_DIR, KLINE_DTYPE
+from ohlc_frames import candles_frame
+from rollups import ROLLUPS, aggregate, update_rollups
+
+# Number of worker processes for the transform and analysis stage (1 keeps everything in-process)
+ANALYSIS_WORKERS = int(os.getenv("ANALYSIS_WORKERS", "1"))
+
+# Candle timeframe analyzed for each indicator timeframe
+INDICATOR_SOURCES = {
+    "short": "hourly",
+    "medium": "daily",
+    "long": "weekly",
+}
+
+def share_candles(symbol_candles):
+    """
+    Copy the candles of every symbol into one shared-memory block.
+    Returns the block and a layout mapping each symbol to its (start, stop) rows.
+    """
+    layout = {}
+    count = 0
+    for symbol, candles in symbol_candles.items():
+        if len(candles):
+            layout[symbol] = (count, count + len(candles))
+            count += len(candles)
+
+    # A block cannot be empty, keep at least one record
+    block = shared_memory.SharedMemory(create=True, size=max(count, 1) * KLINE_DTYPE.itemsize)
+    shared = np.ndarray((count,), dtype=KLINE_DTYPE, buffer=block.buf)
+    for symbol, (start, stop) in layout.items():
+        shared[start:stop] = symbol_candles[symbol]
+    del shared
+    return block, layout
+
+def read_shared_candles(block_name, layout):
+    """
+    Attach to a shared-memory block and copy out the candles of the given symbols.
+    The copies are small (one shard) and let the block be closed right away.
+    """
+    block = shared_memory.SharedMemory(name=block_name)
+    try:
+        count = max((stop for _, stop in layout.values()), default=0)
+        shared = np.ndarray((count,), dtype=KLINE_DTYPE, buffer=block.buf)
+        symbol_candles = {symbol: shared[start:stop].copy() for symbol, (start, stop) in layout.items()}
+        del shared
+        return symbol_candles
+    finally:
+        block.close()
+
+def shard_symbols(symbols, workers):
+    """
+    Split the symbols into at most `workers` shards of similar size.
+    """
+    shards = [symbols[i::workers] for i in range(workers)]
+    return [shard for shard in shards if shard]
+
+def states_for(states, symbols):
+    """
+    Select the indicator states ("<timeframe>:<symbol>" keys) of the given symbols.
+    """
+    symbols = set(symbols)
+    return {key: state for key, state in states.items() if key.split(":", 1)[1] in symbols}
+
+def index_states(states):
+    """
+    Group the indicator states ("<timeframe>:<symbol>" keys) by symbol, so the states of one
+    symbol are found without scanning every key as states_for does.
+    """
+    by_symbol = {}
+    for key, state in states.items():
+        by_symbol.setdefault(key.split(":", 1)[1], {})[key] = state
+    return by_symbol
+
+def analyze_candles(data, rollup_mode, indicator_mode, states, archive_dir=ARCHIVE_DIR):
+    """
+    Transform and analyze the candles of a set of symbols.
+    - data: {timeframe: {symbol: candles}}; when only "hourly" is given, the daily and weekly
+      bars are rolled up from it (incrementally or from scratch).
+    - states: the persisted indicator states of these symbols, updated in place in incremental mode.
+    Returns the rolled-up daily and weekly candles (empty when fetched natively),
+    the indicator tables and the updated states.
+    """
+    rolled_up = {}
+    if "daily" not in data:
+        rolled_up = {name: {} for name in ROLLUPS}
+        for symbol, candles in data["hourly"].items():
+            if rollup_mode == "incremental":
+                rollups = update_rollups(symbol, candles, int(candles["open_time"][0]), archive_dir=archive_dir)
+            else:
+                rollups = {name: aggregate(candles, label_fn(candles["open_time"]))
+                           for name, label_fn in ROLLUPS.items()}
+            for name in ROLLUPS:
+                rolled_up[name][symbol] = rollups[name]
+        data = dict(data, **rolled_up)
+
+    tables = {}
+    for indicator_timeframe, timeframe in INDICATOR_SOURCES.items():
+        frame = candles_frame(data[timeframe])
+        if frame is None:
+            continue
+        if indicator_mode == "incremental":
+            tables[indicator_timeframe] = update_indicators(frame, indicator_timeframe, states)
+        else:
+            tables[indicator_timeframe] = compute_indicators(frame)
+
+    return rolled_up, tables, states
+
+def analyze_shard(blocks, shard, rollup_mode, indicator_mode, states, archive_dir):
+    """
+    Worker entry point: read the candles of one shard from shared memory and analyze them.
+    - blocks: {timeframe: (block name, layout)} for the shared candles.
+    Returns the same values as analyze_candles.
+    """
+    data = {}
+    for timeframe, (block_name, layout) in blocks.items():
+        data[timeframe] = read_shared_candles(block_name, {s: layout[s] for s in shard if s in layout})
+    return analyze_candles(data, rollup_mode, indicator_mode, states, archive_dir)
+
+def run_analysis_pool(data_by_timeframe, workers=ANALYSIS_WORKERS, rollup_mode="incremental",
+                      indicator_mode="incremental", state_path=STATE_PATH, archive_dir=ARCHIVE_DIR):
+    """
+    Shard the symbols across a process pool for the transform and analysis stage.
+    - data_by_timeframe: {"hourly": {symbol: candles}} (daily/weekly rolled up by the workers)
+      or all three timeframes when they were fetched natively.
+    - Candles reach the workers through shared memory instead of being pickled; only the
+      compact rolled-up daily/weekly arrays and the indicator tables come back.
+    - The indicator state is loaded and saved once here; each worker gets the states of its shard.
+    Returns the per-symbol candles of each timeframe and the merged indicator tables.
+    """
+    symbols = list(data_by_timeframe["hourly"])
+    shards = shard_symbols(symbols, max(workers, 1))
+    states = load_state(state_path) if indicator_mode == "incremental" else {}
+
+    blocks = {}
+    try:
+        for timeframe, symbol_candles in data_by_timeframe.items():
+            blocks[timeframe] = share_candles(symbol_candles)
+        shared = {timeframe: (block.name, layout) for timeframe, (block, layout) in blocks.items()}
+
+        with ProcessPoolExecutor(max_workers=len(shards) or 1) as executor:
+            futures = []
+            for shard in shards:
+                futures.append(executor.submit(analyze_shard, shared, shard, rollup_mode, indicator_mode,
+                                               states_for(states, shard), archive_dir))
+            results = [future.result() for future in futures]
+    finally:
+        for block, _ in blocks.values():
+            block.close()
+            block.unlink()
+
+    # Merge the per-shard results for the Notion stage
+    merged = {timeframe: dict(data_by_timeframe.get(timeframe, {})) for timeframe in INDICATOR_SOURCES.values()}
+    shard_tables = {indicator_timeframe: [] for indicator_timeframe in INDICATOR_SOURCES}
+    for rolled_up, tables, shard_states in results:
+        for timeframe, symbol_candles in rolled_up.items():
+            merged[timeframe].update(symbol_candles)
+        for indicator_timeframe, table in tables.items():
+            shard_tables[indicator_timeframe].append(table)
+        states.update(shard_states)
+
+    if indicator_mode == "incremental":
+        save_state(states, state_path)
+
+    indicator_tables = {
+        indicator_timeframe: pd.concat(tables) if tables else pd.DataFrame()
+        for indicator_timeframe, tables in shard_tables.items()
+    }
+    return merged, indicator_tables
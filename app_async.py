@@ -1,32 +1,102 @@
 import asyncio
 import aiohttp
-import pandas as pd
-from notion_client import AsyncClient
 import os
 from dotenv import load_dotenv
 import time
 import json
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from http_transport import (HTTP_READ_TIMEOUT, closing_transport, get_async_notion_http, get_async_session,
+                            retry_connection, transient_errors, transport_stats)
+from kline_store import (ARCHIVE_DIR, load_candles, load_first_open, merge_and_persist, next_start_time,
+                         window_start_ms)
+from kline_parser import DECODE_ERRORS, decode_klines
+from kline_planner import (KLINES_LIMIT, NATIVE_INTERVALS, NATIVE_LOOKBACK_BARS, OHLC_FETCH_MODE, lookback_days,
+                            merge_kline_pages, plan_kline_windows)
+from market_cache import (chunk_ids, load_cached_markets, market_params, split_chunk_results,
+                          store_cached_markets)
+from notion_diff import diff_properties
+from notion_query import NOTION_PUSH_FILTERS, projected_property_ids, watchlist_filter
+from notion_snapshot import NOTION_SYNC_MODE, apply_sync, get_snapshot, incremental_filter
+from notion_writes import run_write_queue_async, send_updates_async, summarize_writes
+from ohlc_export import OHLC_EXPORT_FORMAT, export_candles, export_ohlc
+from rate_limit import BINANCE_LIMITS, COINGECKO_LIMITS, KLINES_WEIGHT, NOTION_LIMITS, AsyncRateLimiter
+from rollups import OHLC_ROLLUP_MODE, update_rollups
+from run_metrics import RunMetrics
 
 # Load environment variables
 load_dotenv()
 api_key = os.getenv("NOTION_API_KEY")
 database_id = os.getenv("NOTION_DATABASE_ID")
 
-# Initialize Notion client
-notion = AsyncClient(auth=api_key)
+# Base URLs of the external APIs, overridable to run against local stand-ins (see fake_services.py)
+BINANCE_BASE_URL = os.getenv("BINANCE_BASE_URL", "https://api.binance.com")
+COINGECKO_BASE_URL = os.getenv("COINGECKO_BASE_URL", "https://api.coingecko.com")
+NOTION_BASE_URL = os.getenv("NOTION_BASE_URL", "https://api.notion.com")
 
-async def get_full_table(database_id):
+# "pipelined" streams each symbol from its fetch to its Notion update, "staged" runs one stage after another
+ASYNC_MAIN_MODE = os.getenv("ASYNC_MAIN_MODE", "pipelined")
+
+# Connection failures and timeouts retried through the transport (see http_transport.py)
+TRANSIENT_ERRORS = transient_errors()
+
+# Notion client, created on first use (see get_notion)
+notion = None
+
+# Shared schedulers keeping Binance, CoinGecko and Notion calls under their rate limits
+binance_limiter = AsyncRateLimiter(**BINANCE_LIMITS)
+coingecko_limiter = AsyncRateLimiter(**COINGECKO_LIMITS)
+notion_limiter = AsyncRateLimiter(**NOTION_LIMITS)
+
+# Per-stage timings and request counters of the current run
+run_metrics = RunMetrics()
+
+def get_notion():
     """
-    Retrieve all entries from the specified Notion database without filtering.
-    Save the results to a file for reference.
+    Return the Notion client, creating it on first use so importing this module stays cheap.
+    Its requests go through the pooled httpx client of http_transport, one per event loop, so the
+    client is recreated when a new loop starts (e.g. a later asyncio.run).
+    """
+    global notion
+    http_client = get_async_notion_http()
+    if notion is None or notion.client is not http_client:
+        from notion_client import AsyncClient
+        notion = AsyncClient(auth=api_key, base_url=NOTION_BASE_URL, timeout_ms=int(HTTP_READ_TIMEOUT * 1000),
+                             client=http_client)
+    return notion
+
+async def get_full_table(database_id, sync_mode=NOTION_SYNC_MODE, push_filters=NOTION_PUSH_FILTERS):
+    """
+    Retrieve the entries of the specified Notion database.
+    - With push_filters, full passes only return watchlist rows and every query
+      only returns the properties read by the pipeline.
+    - In "incremental" mode, only pages edited since the last sync are queried and merged
+      into the local snapshot; a full pass runs periodically to reconcile deletions.
+    - In "full" mode, every page is queried and the results are saved to a file for reference.
     """
     try:
         all_results = []
         next_cursor = None
+        query_args = {"database_id": database_id}
+
+        snapshot = get_snapshot() if sync_mode == "incremental" else None
+        query_filter = incremental_filter(snapshot, database_id) if snapshot else None
+        if query_filter:
+            # Incremental passes keep every edited page, so rows leaving the watchlist are refreshed too
+            query_args["filter"] = query_filter
+        elif push_filters:
+            query_args["filter"] = watchlist_filter()
+
+        if push_filters:
+            # Only request the properties the pipeline reads
+            database = await get_notion().databases.retrieve(database_id=database_id)
+            run_metrics.count("notion_read", "requests")
+            query_args["filter_properties"] = projected_property_ids(database)
 
         # Fetch all entries with pagination
         while True:
-            response = await notion.databases.query(database_id=database_id, start_cursor=next_cursor)
+            response = await get_notion().databases.query(**query_args, start_cursor=next_cursor)
+            run_metrics.count("notion_read", "requests")
             all_results.extend(response["results"])
 
             # Check if there are more pages to retrieve
@@ -34,9 +104,14 @@ async def get_full_table(database_id):
                 break
             next_cursor = response.get("next_cursor")
 
-        # Save results to a file for reference
-        with open("full_table_results.json", "w") as f:
-            json.dump(all_results, f, indent=4)
+        if snapshot:
+            # Merge the retrieved pages into the local snapshot
+            print(f"Notion {'incremental' if query_filter else 'full'} sync: {len(all_results)} pages retrieved.")
+            all_results = apply_sync(snapshot, database_id, all_results, full=query_filter is None)
+        else:
+            # Save results to a file for reference
+            with open("full_table_results.json", "w") as f:
+                json.dump(all_results, f, indent=4)
 
         print(f"Total entries retrieved: {len(all_results)}")
         return all_results
@@ -120,195 +195,266 @@ def filter_for_binance(full_table):
     print(f"Total entries for Binance: {len(binance_list)}")
     return binance_list
 
+async def fetch_coingecko_chunk(session, url, params):
+    """
+    Fetch one chunk of /coins/markets data, paced by the shared CoinGecko limiter.
+    """
+    attempt = 0
+    failures = 0
+    while True:
+        try:
+            async with coingecko_limiter.slot(), session.get(url, params=params) as response:
+                if coingecko_limiter.observe(response.status, response.headers, attempt):  # Handle rate limits and server errors
+                    attempt += 1
+                    print(f"CoinGecko returned {response.status}. Retrying (attempt {attempt})...")
+                    continue
+                response.raise_for_status()  # Raise an exception for HTTP errors
+                run_metrics.count("coingecko", "bytes", len(await response.read()))
+                return await response.json()
+        except TRANSIENT_ERRORS as e:
+            failures += 1
+            await retry_connection(e, failures, "CoinGecko")
+
 async def fetch_general_data_coingecko(crypto_list, vs_currency="usd"):
     """
     Fetch general data for a list of cryptocurrencies from CoinGecko.
+    - Market data fetched less than COINGECKO_CACHE_TTL seconds ago is reused from the on-disk cache.
+    - The remaining ids are split into chunks of at most 250 ids, fetched concurrently
+      through the shared HTTP session within the free-tier rate limit.
     Save the fetched data to a primary file for reference.
     """
     if not crypto_list:
         print("Crypto list is empty. Nothing to fetch.")
         return {}
 
-    # API endpoint and parameters for the request
-    url = "https://api.coingecko.com/api/v3/coins/markets"
-    params = {
-        "vs_currency": vs_currency,
-        "ids": ",".join(crypto_list),
-        "order": "market_cap_desc",
-        "per_page": len(crypto_list),
-        "page": 1,
-        "price_change_percentage": "7d,30d"
-    }
+    # API endpoint for the request
+    url = f"{COINGECKO_BASE_URL}/api/v3/coins/markets"
 
-    async with aiohttp.ClientSession() as session:
-        try:
-            # Fetch data from CoinGecko API
-            async with session.get(url, params=params) as response:
-                response.raise_for_status()  # Raise an exception for HTTP errors
-                data = await response.json()
-
-            # Save fetched data to a primary file
-            with open("coingecko_general_data.json", "w") as file:
-                json.dump(data, file, indent=4)
-            print("Data saved to 'coingecko_general_data.json'")
-
-            # Transform the data into a dictionary with the crypto ID as the key
-            general_data = {item["id"]: {
-                "current_price": item["current_price"],
-                "market_cap": item["market_cap"],
-                "fully_diluted_valuation": item.get("fully_diluted_valuation"),
-                "total_volume": item["total_volume"],
-                "price_change_percentage_24h": item["price_change_percentage_24h"],
-                "price_change_percentage_7d_in_currency": item.get("price_change_percentage_7d_in_currency"),
-                "price_change_percentage_30d_in_currency": item.get("price_change_percentage_30d_in_currency")
-            } for item in data}
-
-            # Return the transformed data
-            return general_data
-
-        except aiohttp.ClientError as e:
-            # Handle any errors during the API request
-            print(f"Error fetching general data from CoinGecko: {e}")
-            return {}
-
-async def fetch_ohlc_binance(session, symbol, interval="1h", days=100):
+    try:
+        # Reuse recently fetched market data
+        data, missing_ids = load_cached_markets(crypto_list, vs_currency)
+        print(f"CoinGecko cache: {len(data)} cached, {len(missing_ids)} to fetch.")
+
+        if missing_ids:
+            # Fetch the missing ids from CoinGecko API, one request per chunk
+            # A failed chunk does not cancel the others: what was fetched is kept and cached
+            chunks = chunk_ids(missing_ids)
+            session = get_async_session()
+            results = await asyncio.gather(*[
+                fetch_coingecko_chunk(session, url, market_params(ids, vs_currency)) for ids in chunks
+            ], return_exceptions=True)
+            fetched, failed_ids, errors = split_chunk_results(chunks, results)
+            if failed_ids:
+                print(f"Error fetching general data from CoinGecko for {len(failed_ids)} ids "
+                      f"({', '.join(errors)}). Missing ids: {', '.join(failed_ids)}")
+            store_cached_markets(fetched, vs_currency)
+            data.extend(fetched)
+
+        # Save fetched data to a primary file
+        with open("coingecko_general_data.json", "w") as file:
+            json.dump(data, file, indent=4)
+        print("Data saved to 'coingecko_general_data.json'")
+
+        # Transform the data into a dictionary with the crypto ID as the key
+        general_data = {item["id"]: {
+            "current_price": item["current_price"],
+            "market_cap": item["market_cap"],
+            "fully_diluted_valuation": item.get("fully_diluted_valuation"),
+            "total_volume": item["total_volume"],
+            "price_change_percentage_24h": item["price_change_percentage_24h"],
+            "price_change_percentage_7d_in_currency": item.get("price_change_percentage_7d_in_currency"),
+            "price_change_percentage_30d_in_currency": item.get("price_change_percentage_30d_in_currency")
+        } for item in data}
+
+        # Return the transformed data
+        return general_data
+
+    except TRANSIENT_ERRORS + (aiohttp.ClientError,) as e:
+        # Handle any errors during the API request
+        print(f"Error fetching general data from CoinGecko: {e!r}")
+        return {}
+
+async def fetch_kline_window(session, symbol, interval, start_time, end_time):
     """
-    Fetch OHLC (Open, High, Low, Close) data for a single symbol from Binance.
+    Fetch the klines of one planned (startTime, endTime) window from Binance.
+    Rate limiting is handled by the shared Binance scheduler.
     """
-    BASE_URL = "https://api.binance.com/api/v3/klines"
-    print(f"Fetching data for {symbol}...")
+    url = f"{BINANCE_BASE_URL}/api/v3/klines"
     params = {
         "symbol": symbol,
         "interval": interval,
-        "limit": 1000  # The limit of data per request
+        "startTime": start_time,
+        "endTime": end_time,
+        "limit": KLINES_LIMIT  # The limit of data per request
     }
-    symbol_data = []
-    end_time = None
+    attempt = 0
+    failures = 0
 
-    try:
-        # Loop to fetch data for the given number of days
-        for _ in range(days * 24 // 1000 + 1):  # Adjust to the number of requests needed
-            if end_time:
-                params["endTime"] = end_time  # Set the end time for the next request
-            async with session.get(BASE_URL, params=params) as response:
-                if response.status == 429:  # Handle rate limit exceeded
-                    print("Rate limit exceeded. Waiting 60 seconds...")
-                    await asyncio.sleep(60)
+    while True:
+        try:
+            async with binance_limiter.slot(KLINES_WEIGHT), session.get(url, params=params) as response:
+                if binance_limiter.observe(response.status, response.headers, attempt):  # Handle rate limits and server errors
+                    attempt += 1
+                    print(f"Binance returned {response.status} for {symbol}. Retrying (attempt {attempt})...")
                     continue
                 response.raise_for_status()  # Raise an error for bad HTTP responses
-                data = await response.json()
-                if not data:  # If no data is returned, stop fetching
-                    break
-                symbol_data.extend(data)  # Add the fetched data to the list
-                end_time = data[0][0]  # Set the end time for the next batch
-        return symbol, symbol_data
-
-    except aiohttp.ClientError as e:
+                body = await response.read()
+                run_metrics.count("binance", "bytes", len(body))
+                return decode_klines(body)  # Decode straight into a typed candle array
+        except TRANSIENT_ERRORS as e:
+            failures += 1
+            await retry_connection(e, failures, f"Binance ({symbol})")
+
+async def fetch_ohlc_binance(session, symbol, interval="1h", days=100, archive_dir=ARCHIVE_DIR):
+    """
+    Fetch OHLC (Open, High, Low, Close) data for a single symbol from Binance.
+    Only candles newer than the last one stored in the local archive are requested,
+    all missing windows are fetched concurrently, then the archive is trimmed to the requested window.
+    """
+    print(f"Fetching data for {symbol}...")
+    symbol_start = time.perf_counter()
+    window_start = window_start_ms(days)
+    stored = load_candles(symbol, interval, archive_dir)
+
+    try:
+        # Request every missing window of the period at once, from the first missing candle onwards
+        windows = plan_kline_windows(
+            next_start_time(stored, interval, window_start, load_first_open(symbol, interval, archive_dir)), interval
+        )
+        pages = await asyncio.gather(*[fetch_kline_window(session, symbol, interval, start, end) for start, end in windows])
+        candles = merge_kline_pages(pages)
+
+        # Store the new candles and keep only the requested window
+        return symbol, merge_and_persist(symbol, interval, stored, candles, window_start, archive_dir)
+
+    except TRANSIENT_ERRORS + (aiohttp.ClientError,) as e:
         # Log any error that occurs during the data fetch process
-        print(f"Error fetching data for {symbol}: {e}")
+        print(f"Error fetching data for {symbol}: {e!r}")
         return symbol, []  # If there's an error, store an empty list for this symbol
 
-async def fetch_ohlc_binance_multi(symbols, interval="1h", days=100):
+    except DECODE_ERRORS as e:
+        # A malformed response only drops this symbol
+        print(f"Error decoding data for {symbol}: {e!r}")
+        return symbol, []
+
+    finally:
+        # Per-symbol fetch latency, including rate-limit waits
+        run_metrics.observe("binance", time.perf_counter() - symbol_start)
+
+async def fetch_ohlc_binance_multi(symbols, interval="1h", days=100, archive_dir=ARCHIVE_DIR):
     """
     Fetch OHLC (Open, High, Low, Close) data for multiple symbols from Binance concurrently.
-    Returns a dictionary with the symbol as the key and the raw data as the value.
+    Returns a dictionary with the symbol as the key and the candle array as the value.
     """
-    async with aiohttp.ClientSession() as session:
-        tasks = [fetch_ohlc_binance(session, symbol, interval, days) for symbol in symbols]
-        results = await asyncio.gather(*tasks)
+    session = get_async_session()
+    tasks = [fetch_ohlc_binance(session, symbol, interval, days, archive_dir) for symbol in symbols]
+    results = await asyncio.gather(*tasks)
     
     all_data = {symbol: data for symbol, data in results}
     return all_data
 
 
-def transform_and_save_multi(data, filename_prefix="ohlc_data"):
+async def fetch_ohlc_binance_native(symbols, lookback_bars=NATIVE_LOOKBACK_BARS, archive_dir=ARCHIVE_DIR):
+    """
+    Fetch every timeframe at its own Binance interval (1h, 1d, 1w), concurrently.
+    - Each interval only covers the lookback the indicators need, usually one request per symbol.
+    - Weekly candles follow Binance's Monday-open weeks.
+    Returns a dictionary mapping each timeframe to the per-symbol candles.
+    """
+    timeframes = list(NATIVE_INTERVALS)
+    results = await asyncio.gather(*(
+        fetch_ohlc_binance_multi(symbols, interval=NATIVE_INTERVALS[timeframe],
+                                 days=lookback_days(NATIVE_INTERVALS[timeframe], lookback_bars),
+                                 archive_dir=archive_dir)
+        for timeframe in timeframes
+    ))
+    return dict(zip(timeframes, results))
+
+def transform_and_save_multi(data, filename_prefix="ohlc_data", export_format=OHLC_EXPORT_FORMAT,
+                             rollup_mode=OHLC_ROLLUP_MODE, archive_dir=ARCHIVE_DIR, release=False):
     """
-    Transform and save OHLC data for multiple cryptocurrencies into CSV files.
-    The function generates hourly, daily, and weekly data and saves them to separate files.
+    Transform and save OHLC data for multiple cryptocurrencies.
+    The input maps each symbol to a candle array of hourly candles as returned by fetch_ohlc_binance_multi.
+    The function generates hourly, daily, and weekly data and exports them in the selected
+    format (CSV, Parquet or Arrow IPC, or no export at all).
+    In "incremental" rollup mode, the daily and weekly data are maintained from the new hourly
+    candles only (see rollups.update_rollups) instead of resampling the whole history.
+    With release, the candle arrays are removed from `data` as they are copied into the hourly
+    DataFrame (see ohlc_frames.candles_frame), so the raw candles and the frame are not held twice.
     Returns the DataFrames for in-memory usage.
     """
     if not data:
         print("No data to transform.")
         return None, None, None
 
+    from ohlc_frames import VALUE_COLUMNS, candles_frame
+
     try:
-        all_dfs = []  # List to store individual DataFrames for each symbol
+        symbol_rollups = {}  # Daily and weekly rollups of each symbol, in incremental mode
 
         for symbol, raw_data in data.items():
-            if not raw_data:
+            if len(raw_data) == 0:
                 print(f"No data for {symbol}. Skipping...")
                 continue
 
-            # Convert raw OHLC data to a DataFrame
-            try:
-                df = pd.DataFrame(raw_data, columns=["timestamp", "open", "high", "low", "close", "volume",
-                                                     "close_time", "quote_asset_volume", "number_of_trades",
-                                                     "taker_buy_base_volume", "taker_buy_quote_volume", "ignore"])
-                # Keep only the relevant columns
-                df = df[["timestamp", "open", "high", "low", "close", "volume"]]
-                df["timestamp"] = pd.to_datetime(df["timestamp"], unit="ms")  # Convert timestamps to datetime
-                df["symbol"] = symbol  # Add the crypto symbol as a column
-
-                # Convert numeric columns to appropriate types
-                for col in ["open", "high", "low", "close", "volume"]:
-                    df[col] = pd.to_numeric(df[col], errors="coerce")
-
-                # Drop rows with NaN values in critical columns
-                df.dropna(subset=["open", "high", "low", "close", "volume"], inplace=True)
-                all_dfs.append(df)
-            except Exception as e:
-                print(f"Error processing data for {symbol}: {e}")
-
-        if not all_dfs:
+            # Update only the daily and weekly buckets touched by the new candles
+            if rollup_mode == "incremental":
+                try:
+                    window_start = int(raw_data["open_time"][0])
+                    symbol_rollups[symbol] = update_rollups(symbol, raw_data, window_start, archive_dir=archive_dir)
+                except Exception as e:
+                    print(f"Error processing data for {symbol}: {e}")
+
+        # Build the hourly DataFrame in one pass, freeing each symbol's candle array once it is copied
+        hourly_df = candles_frame(data, release=release)
+        if hourly_df is None:
             print("No valid data to combine. Exiting transformation.")
             return None, None, None
 
-        # Combine all individual DataFrames into one
-        combined_df = pd.concat(all_dfs)
-        if combined_df.empty:
-            print("Combined DataFrame is empty. Exiting transformation.")
-            return None, None, None
+        # Drop rows with NaN values in critical columns
+        if hourly_df[VALUE_COLUMNS].isna().to_numpy().any():
+            hourly_df = hourly_df.dropna(subset=VALUE_COLUMNS).reset_index(drop=True)
 
-        combined_df.set_index("timestamp", inplace=True)
+        # Export hourly data
+        export_ohlc(hourly_df, filename_prefix, "hourly", export_format)
 
-        # Reorder columns for the hourly CSV file
-        combined_df = combined_df[["symbol", "open", "high", "low", "close", "volume"]]
-
-        # Save hourly data to a CSV file
-        hourly_df = combined_df.reset_index()
-        hourly_df.to_csv(f"{filename_prefix}_hourly.csv", index=False)
-        print(f"Hourly data saved to {filename_prefix}_hourly.csv")
+        # Time-indexed view of the hourly data, only needed to resample it
+        combined_df = hourly_df.set_index("timestamp") if rollup_mode != "incremental" else None
 
         # Aggregate data to daily intervals
         try:
-            daily_df = combined_df.groupby("symbol").resample("1D").agg({
-                "open": "first",
-                "high": "max",
-                "low": "min",
-                "close": "last",
-                "volume": "sum"
-            }).reset_index()
-
-            daily_df = daily_df[["timestamp", "symbol", "open", "high", "low", "close", "volume"]]
-            daily_df.to_csv(f"{filename_prefix}_daily.csv", index=False)
-            print(f"Daily data saved to {filename_prefix}_daily.csv")
+            if rollup_mode == "incremental":
+                daily_df = candles_frame({symbol: rollups["daily"] for symbol, rollups in symbol_rollups.items()})
+            else:
+                daily_df = combined_df.groupby("symbol", observed=True).resample("1D").agg({
+                    "open": "first",
+                    "high": "max",
+                    "low": "min",
+                    "close": "last",
+                    "volume": "sum"
+                }).reset_index()
+
+                daily_df = daily_df[["timestamp", "symbol", "open", "high", "low", "close", "volume"]]
+            export_ohlc(daily_df, filename_prefix, "daily", export_format)
         except Exception as e:
             print(f"Error aggregating daily data: {e}")
             daily_df = None
 
         # Aggregate data to weekly intervals
         try:
-            weekly_df = combined_df.groupby("symbol").resample("1W").agg({
-                "open": "first",
-                "high": "max",
-                "low": "min",
-                "close": "last",
-                "volume": "sum"
-            }).reset_index()
-
-            weekly_df = weekly_df[["timestamp", "symbol", "open", "high", "low", "close", "volume"]]
-            weekly_df.to_csv(f"{filename_prefix}_weekly.csv", index=False)
-            print(f"Weekly data saved to {filename_prefix}_weekly.csv")
+            if rollup_mode == "incremental":
+                weekly_df = candles_frame({symbol: rollups["weekly"] for symbol, rollups in symbol_rollups.items()})
+            else:
+                weekly_df = combined_df.groupby("symbol", observed=True).resample("1W").agg({
+                    "open": "first",
+                    "high": "max",
+                    "low": "min",
+                    "close": "last",
+                    "volume": "sum"
+                }).reset_index()
+
+                weekly_df = weekly_df[["timestamp", "symbol", "open", "high", "low", "close", "volume"]]
+            export_ohlc(weekly_df, filename_prefix, "weekly", export_format)
         except Exception as e:
             print(f"Error aggregating weekly data: {e}")
             weekly_df = None
@@ -320,6 +466,31 @@ def transform_and_save_multi(data, filename_prefix="ohlc_data"):
         print(f"Error during transformation or saving: {e}")
         return None, None, None
 
+def transform_and_save_native(data_by_timeframe, filename_prefix="ohlc_data", export_format=OHLC_EXPORT_FORMAT):
+    """
+    Build and export the hourly, daily and weekly DataFrames from natively fetched candles.
+    No resampling is needed: each timeframe already comes at its own interval.
+    """
+    from ohlc_frames import candles_frame
+
+    try:
+        frames = []
+        for timeframe in NATIVE_INTERVALS:
+            df = candles_frame(data_by_timeframe.get(timeframe, {}))
+            if df is None:
+                print(f"No valid {timeframe} data. Exiting transformation.")
+                return None, None, None
+
+            df.dropna(subset=["open", "high", "low", "close", "volume"], inplace=True)
+            export_ohlc(df, filename_prefix, timeframe, export_format)
+            frames.append(df)
+
+        return tuple(frames)
+
+    except Exception as e:
+        print(f"Error during transformation or saving: {e}")
+        return None, None, None
+
 def analyze_trend(ohlc_data):
     """
     Analyze the market trend (Bullish, Bearish, or Range) using moving averages.
@@ -411,37 +582,182 @@ async def update_security_entry(page_id, properties):
       and values are the new values for those properties.
 
     Behavior:
-    - Uses the Notion API to update the page with the specified ID.
+    - Uses the Notion API to update the page with the specified ID, paced by the shared Notion limiter.
+    - Retries rate-limited and transient failures, honouring the Retry-After header.
     - Prints a success message upon successful update.
     - Prints an error message if the update fails.
+    - Returns True if the page was updated, False otherwise.
     """
-    try:
-        # Update the page in the Notion database with the provided properties
-        await notion.pages.update(page_id=page_id, properties=properties)
-        print(f"Updated page {page_id} successfully.")
-    except Exception as e:
-        # Handle and log any errors that occur during the update process
-        print(f"Error updating page {page_id}: {e}")
+    attempt = 0
+    while True:
+        try:
+            # Update the page in the Notion database with the provided properties
+            async with notion_limiter.slot():
+                start = time.perf_counter()
+                await get_notion().pages.update(page_id=page_id, properties=properties)
+                run_metrics.observe("notion_writes", time.perf_counter() - start)
+            print(f"Updated page {page_id} successfully.")
+            return True
+        except Exception as e:
+            # Retry when Notion asks us to slow down or is temporarily unavailable
+            if notion_limiter.observe(getattr(e, "status", None), getattr(e, "headers", None) or {}, attempt):
+                attempt += 1
+                print(f"Notion rate limit or transient error for page {page_id}. Retrying (attempt {attempt})...")
+                continue
+            # Handle and log any errors that occur during the update process
+            print(f"Error updating page {page_id}: {e}")
+            return False
+
+def entry_api_ids(entry):
+    """
+    Return the CoinGecko and Binance ids of a Notion entry (None when missing).
+    """
+    coingecko_id = None
+    binance_id = None
+
+    # Validation of ID API Coingecko
+    coingecko_property = entry["properties"].get("ID API Coingecko", {})
+    if "rich_text" in coingecko_property and coingecko_property["rich_text"]:
+        coingecko_id = coingecko_property["rich_text"][0].get("text", {}).get("content")
+
+    # Validation of ID API Binance
+    binance_property = entry["properties"].get("ID API Binance", {})
+    if "rich_text" in binance_property and binance_property["rich_text"]:
+        binance_id = binance_property["rich_text"][0].get("text", {}).get("content")
+
+    return coingecko_id, binance_id
+
+def build_entry_update(entry, general_data, indicator_tables):
+    """
+    Build the Notion properties to update for one entry from the CoinGecko data and the indicator tables.
+    Only the properties whose value differs from Notion are kept.
+    - indicator_tables is None when the OHLC stage did not run: the trend properties are left as they are.
+    Returns None when the entry has a Binance id but no OHLC data, so the entry is skipped.
+    """
+    coingecko_id, binance_id = entry_api_ids(entry)
+    updated_properties = {}
+
+    # Add CoinGecko data
+    if coingecko_id and coingecko_id in general_data:
+
+        data = general_data[coingecko_id]
+        if data:  # Vérifie que des données existent
+            print(f"Updating CoinGecko data for {coingecko_id}: {data}")
+            updated_properties.update({
+                "Price": {"number": data.get("current_price")},
+                "Market Cap": {"number": data.get("market_cap")},
+                "FDV": {"number": data.get("fully_diluted_valuation")},
+                "Volume 24h": {"number": data.get("total_volume")},
+                "24h Change %": {"number": data.get("price_change_percentage_24h")},
+                "7d Change %": {"number": data.get("price_change_percentage_7d_in_currency")},
+                "30d Change %": {"number": data.get("price_change_percentage_30d_in_currency")},
+            })
+        else:
+            print(f"No data found for {coingecko_id}. Skipping...")
+    else:
+        print(f"CoinGecko ID {coingecko_id} not in general_data. Skipping...")
+
+    # Add Binance analysis
+    if binance_id and indicator_tables is not None:
+        from indicators import indicator_properties
+
+        print(f"Fetching Binance trends and momentum for {binance_id}...")
+        indicator_update = indicator_properties(indicator_tables, binance_id)
+        if indicator_update is None:
+            print(f"No OHLC data available for {binance_id}. Skipping...")
+            return None
+
+        updated_properties.update(indicator_update)
+
+    # Keep only the properties whose value differs from what is already in Notion
+    return diff_properties(entry["properties"], updated_properties)
 
-async def main():
+async def fetch_and_analyze_ohlc(binance_symbols):
     """
-    Main function to orchestrate the program.
+    Fetch, transform and analyze the Binance OHLC data of the watchlisted symbols.
+    The analysis stack (pandas and the indicator modules) is only imported here, so runs
+    that skip the OHLC stage never load it.
+    Returns the indicator tables, or None when the analysis cannot complete.
+    """
+    if not binance_symbols:
+        print("No Binance symbols available to fetch.")
+        return None
+
+    from analysis_pool import ANALYSIS_WORKERS, run_analysis_pool
+    from indicator_state import INDICATOR_MODE, update_indicator_tables
+    from indicators import build_indicator_tables
+
+    print("Fetching OHLC data from Binance...")
+    with run_metrics.stage("binance", binance_limiter):
+        if OHLC_FETCH_MODE == "native":
+            ohlc_data = await fetch_ohlc_binance_native(binance_symbols)
+            data_by_timeframe = ohlc_data
+        else:
+            ohlc_data = await fetch_ohlc_binance_multi(binance_symbols, interval="1h", days=365)
+            data_by_timeframe = {"hourly": ohlc_data}
+
+    if ANALYSIS_WORKERS > 1:
+        # Shard the transform and analysis across worker processes, off the event loop
+        print(f"Transforming and analyzing OHLC data in {ANALYSIS_WORKERS} processes...")
+        with run_metrics.stage("analysis"):
+            candles_by_timeframe, indicator_tables = await asyncio.to_thread(
+                run_analysis_pool, data_by_timeframe, rollup_mode=OHLC_ROLLUP_MODE, indicator_mode=INDICATOR_MODE
+            )
+        with run_metrics.stage("transform"):
+            export_candles(candles_by_timeframe, filename_prefix="crypto_ohlc")
+
+        if any(table.empty for table in indicator_tables.values()):
+            print("Analysis failed or data is incomplete. Exiting.")
+            return None
+        return indicator_tables
+
+    print("Transforming and saving OHLC data...")
+    with run_metrics.stage("transform"):
+        if OHLC_FETCH_MODE == "native":
+            hourly_df, daily_df, weekly_df = transform_and_save_native(ohlc_data, filename_prefix="crypto_ohlc")
+        else:
+            hourly_df, daily_df, weekly_df = transform_and_save_multi(ohlc_data, filename_prefix="crypto_ohlc", release=True)
+    print("Transformation completed. DataFrames created.")
+
+    # Validate transformation results
+    if hourly_df is None or daily_df is None or weekly_df is None:
+        print("Transformation failed or data is incomplete. Exiting.")
+        return None
+
+    if hourly_df.empty or daily_df.empty or weekly_df.empty:
+        print("One or more DataFrames are empty. Exiting.")
+        return None
+
+    # Compute the trend and momentum indicators of every symbol and timeframe at once
+    print("Computing indicators...")
+    with run_metrics.stage("analysis"):
+        if INDICATOR_MODE == "incremental":
+            return update_indicator_tables(hourly_df, daily_df, weekly_df)
+        return build_indicator_tables(hourly_df, daily_df, weekly_df)
+
+async def main_staged(prices=True, ohlc=True):
+    """
+    Staged orchestration: each stage starts once the previous one is complete.
     This includes fetching data from Notion, filtering data for CoinGecko and Binance,
     retrieving and processing market data, and updating Notion entries with the results.
     """
+    run_metrics.reset()
+    transport_before = transport_stats()
     try:
         # Step 1: Fetch the full table from Notion
         print("Fetching data from Notion...")
-        full_table = await get_full_table(database_id)
+        with run_metrics.stage("notion_read"):
+            full_table = await get_full_table(database_id)
         if not full_table:
             print("No entries retrieved from the database.")
-            return
+            return False
         print("Data fetched from Notion successfully.")
 
         # Step 2: Filter data for CoinGecko and Binance
         print("Filtering data for CoinGecko and Binance...")
-        coingecko_list = filter_for_coingecko(full_table)
-        binance_list = filter_for_binance(full_table)
+        with run_metrics.stage("filtering"):
+            coingecko_list = filter_for_coingecko(full_table) if prices else []
+            binance_list = filter_for_binance(full_table) if ohlc else []
         print(f"CoinGecko entries: {len(coingecko_list)}")
         print(f"Binance entries: {len(binance_list)}")
 
@@ -449,115 +765,258 @@ async def main():
         coingecko_ids = [entry["coingecko_id"] for entry in coingecko_list]
         if coingecko_ids:
             print("Fetching general data from CoinGecko...")
-            general_data = await fetch_general_data_coingecko(coingecko_ids)
+            with run_metrics.stage("coingecko", coingecko_limiter):
+                general_data = await fetch_general_data_coingecko(coingecko_ids)
             print("CoinGecko data fetched successfully.")
         else:
             print("No CoinGecko IDs found. Skipping CoinGecko step.")
             general_data = {}
 
-        # Step 4: Fetch and transform Binance OHLC data
-        binance_symbols = [entry["binance_id"] for entry in binance_list]
-        if not binance_symbols:
-            print("No Binance symbols available to fetch.")
-            return
-
-        print("Fetching OHLC data from Binance...")
-        ohlc_data = await fetch_ohlc_binance_multi(binance_symbols, interval="1h", days=365)
-        print("Transforming and saving OHLC data...")
-        hourly_df, daily_df, weekly_df = transform_and_save_multi(ohlc_data, filename_prefix="crypto_ohlc")
-        print("Transformation completed. DataFrames created.")
-
-        # Validate transformation results
-        if hourly_df is None or daily_df is None or weekly_df is None:
-            print("Transformation failed or data is incomplete. Exiting.")
-            return
-
-        if hourly_df.empty or daily_df.empty or weekly_df.empty:
-            print("One or more DataFrames are empty. Exiting.")
-            return
+        # Step 4: Fetch, transform and analyze Binance OHLC data
+        indicator_tables = None
+        if ohlc:
+            indicator_tables = await fetch_and_analyze_ohlc([entry["binance_id"] for entry in binance_list])
+            if indicator_tables is None:
+                return False
 
         # Step 5: Process each Notion entry
         print("Processing Notion entries...")
-        update_tasks = []
+        pending_updates = []
         for entry in full_table:
-            page_id = entry["id"]
-
-            coingecko_id = None
-            binance_id = None
-
-            # Validation of ID API Coingecko
-            coingecko_property = entry["properties"].get("ID API Coingecko", {})
-            if "rich_text" in coingecko_property and coingecko_property["rich_text"]:
-                coingecko_id = coingecko_property["rich_text"][0].get("text", {}).get("content")
-
-            # Validation of ID API Binance
-            binance_property = entry["properties"].get("ID API Binance", {})
-            if "rich_text" in binance_property and binance_property["rich_text"]:
-                binance_id = binance_property["rich_text"][0].get("text", {}).get("content")
-
-            updated_properties = {}
-
-            # Add CoinGecko data
-            if coingecko_id and coingecko_id in general_data:
-
-                data = general_data[coingecko_id]
-                if data:  # Vérifie que des données existent
-                    print(f"Updating CoinGecko data for {coingecko_id}: {data}")
-                    updated_properties.update({
-                        "Price": {"number": data.get("current_price")},
-                        "Market Cap": {"number": data.get("market_cap")},
-                        "FDV": {"number": data.get("fully_diluted_valuation")},
-                        "Volume 24h": {"number": data.get("total_volume")},
-                        "24h Change %": {"number": data.get("price_change_percentage_24h")},
-                        "7d Change %": {"number": data.get("price_change_percentage_7d_in_currency")},
-                        "30d Change %": {"number": data.get("price_change_percentage_30d_in_currency")},
-                    })
-                else:
-                    print(f"No data found for {coingecko_id}. Skipping...")
-            else:
-                print(f"CoinGecko ID {coingecko_id} not in general_data. Skipping...")
+            updated_properties = build_entry_update(entry, general_data, indicator_tables)
+
+            # Update Notion entry if there are changes
+            if updated_properties:
+                print(f"Updating Notion entry {entry['id']} with properties: {updated_properties}")
+                pending_updates.append((entry["id"], updated_properties))
+            elif updated_properties is not None:
+                print(f"No updates needed for page {entry['id']}.")
+
+        # Step 6: Send the updates through the paced Notion write queue
+        with run_metrics.stage("notion_writes", notion_limiter):
+            summary = await run_write_queue_async(update_security_entry, pending_updates, notion_limiter)
+        if (coingecko_ids and not general_data) or summary["failed"]:
+            print("Workflow completed with errors.")
+            return False
+        print("Workflow completed successfully!")
+        return True
 
-            # Add Binance analysis
-            if binance_id:
-                print(f"Fetching Binance trends and momentum for {binance_id}...")
-                hourly_data_filtered = hourly_df[hourly_df["symbol"] == binance_id]
-                daily_data_filtered = daily_df[daily_df["symbol"] == binance_id]
-                weekly_data_filtered = weekly_df[weekly_df["symbol"] == binance_id]
+    except Exception as e:
+        print(f"An error occurred in the main function: {e}")
+        return False
 
-                if hourly_data_filtered.empty or daily_data_filtered.empty or weekly_data_filtered.empty:
-                    print(f"No OHLC data available for {binance_id}. Skipping...")
-                    continue
+    finally:
+        # Report where the time went, including runs that stopped early
+        run_metrics.count_since("http", transport_before, transport_stats())
+        run_metrics.write()
 
-                short_trend = analyze_trend(hourly_data_filtered)
-                medium_trend = analyze_trend(daily_data_filtered)
-                long_trend = analyze_trend(weekly_data_filtered)
-
-                short_momentum = analyze_momentum(hourly_data_filtered)
-                medium_momentum = analyze_momentum(daily_data_filtered)
-                long_momentum = analyze_momentum(weekly_data_filtered)
-
-                updated_properties.update({
-                    "Short Term Trend": {"select": {"name": short_trend["trend"]}},
-                    "Medium Term Trend": {"select": {"name": medium_trend["trend"]}},
-                    "Long Term Trend": {"select": {"name": long_trend["trend"]}},
-                    "Short Term Momentum": {"select": {"name": short_momentum["overview"]}},
-                    "Medium Term Momentum": {"select": {"name": medium_momentum["overview"]}},
-                    "Long Term Momentum": {"select": {"name": long_momentum["overview"]}},
-                })
+# Indicator tables of a symbol without OHLC data (no timeframe at all): its entries are skipped like in the staged flow
+EMPTY_INDICATOR_TABLES = {}
 
-            # Update Notion entry if there are changes
-            if updated_properties:
-                print(f"Updating Notion entry {page_id} with properties: {updated_properties}")
-                update_tasks.append(update_security_entry(page_id, updated_properties))
+async def fetch_general_data_stage(coingecko_ids):
+    """
+    Fetch the CoinGecko data of the watchlist, recorded as the "coingecko" stage.
+    """
+    if not coingecko_ids:
+        print("No CoinGecko IDs found. Skipping CoinGecko step.")
+        return {}
+
+    with run_metrics.stage("coingecko", coingecko_limiter):
+        general_data = await fetch_general_data_coingecko(coingecko_ids)
+    print("CoinGecko data fetched successfully.")
+    return general_data
+
+async def fetch_symbol_candles(session, symbol):
+    """
+    Fetch the candles of one symbol for every timeframe the analysis needs.
+    Returns {timeframe: candles}: "hourly" only in resample mode, the three native intervals otherwise.
+    """
+    if OHLC_FETCH_MODE == "native":
+        results = await asyncio.gather(*(
+            fetch_ohlc_binance(session, symbol, interval=interval, days=lookback_days(interval))
+            for interval in NATIVE_INTERVALS.values()
+        ))
+        return {timeframe: candles for timeframe, (_, candles) in zip(NATIVE_INTERVALS, results)}
+
+    _, candles = await fetch_ohlc_binance(session, symbol, interval="1h", days=365)
+    return {"hourly": candles}
+
+async def update_entries(entries, coingecko_task, indicator_tables, results):
+    """
+    Build and send the Notion updates of some entries once the CoinGecko data is available.
+    The updates are sent by up to NOTION_MAX_IN_FLIGHT workers, paced by the shared Notion limiter.
+    """
+    general_data = await coingecko_task
+    updates = []
+    for entry in entries:
+        updated_properties = build_entry_update(entry, general_data, indicator_tables)
+        if updated_properties:
+            print(f"Updating Notion entry {entry['id']} with properties: {updated_properties}")
+            updates.append((entry["id"], updated_properties))
+        elif updated_properties is not None:
+            print(f"No updates needed for page {entry['id']}.")
+    results.extend(await send_updates_async(update_security_entry, updates, notion_limiter.max_in_flight))
+
+async def process_symbol(session, symbol, entries, coingecko_task, pipeline):
+    """
+    Move one symbol through the pipeline as soon as its candles arrive:
+    - transform and analysis run in the executor, off the event loop;
+    - the Notion updates of the symbol's entries follow immediately.
+    pipeline holds the shared executor, indicator states (also indexed by symbol), collected
+    candles, write results and the symbols that could not be analyzed.
+    When the analysis fails, the entries still receive their CoinGecko update.
+    """
+    from analysis_pool import analyze_candles
+    from indicator_state import INDICATOR_MODE
+
+    indicator_tables = EMPTY_INDICATOR_TABLES
+    try:
+        data = await fetch_symbol_candles(session, symbol)
+
+        if not all(len(candles) for candles in data.values()):
+            pipeline["failed"].append(symbol)
+        else:
+            shard = {timeframe: {symbol: candles} for timeframe, candles in data.items()}
+            # Symbols are analyzed concurrently: record one sample per symbol rather than summed durations
+            with run_metrics.sample("analysis"):
+                rolled_up, indicator_tables, states = await asyncio.get_running_loop().run_in_executor(
+                    pipeline["executor"], analyze_candles, shard, OHLC_ROLLUP_MODE, INDICATOR_MODE,
+                    pipeline["symbol_states"].get(symbol, {}), ARCHIVE_DIR
+                )
+            pipeline["states"].update(states)
+            pipeline["symbol_states"][symbol] = states
+
+            # Keep the candles for the exports written at the end of the run
+            for timeframe, candles in data.items():
+                pipeline["candles"][timeframe][symbol] = candles
+            for timeframe, symbol_candles in rolled_up.items():
+                pipeline["candles"][timeframe][symbol] = symbol_candles[symbol]
+
+    except Exception as e:
+        # One failing symbol must not stop the others; its trend properties are left as they are
+        print(f"Error processing {symbol}: {e}")
+        pipeline["failed"].append(symbol)
+        indicator_tables = None
+
+    try:
+        await update_entries(entries, coingecko_task, indicator_tables, pipeline["results"])
+    except Exception as e:
+        print(f"Error updating the entries of {symbol}: {e}")
+
+async def main_pipelined(prices=True, ohlc=True):
+    """
+    Pipelined orchestration:
+    - CoinGecko and every Binance symbol are fetched concurrently once the Notion table is read.
+    - Each symbol moves on to its transform, analysis and Notion update as soon as its candles
+      arrive, so the run time approaches the slowest symbol instead of the sum of all stages.
+    - CPU work runs in a thread, or in a process pool when ANALYSIS_WORKERS > 1.
+    - The indicator state and the OHLC exports are written once, at the end.
+    Without ohlc, every entry only waits for CoinGecko and the analysis stack is never imported.
+    """
+    run_metrics.reset()
+    transport_before = transport_stats()
+    executor = None
+    try:
+        # Step 1: Fetch the full table from Notion
+        print("Fetching data from Notion...")
+        with run_metrics.stage("notion_read"):
+            full_table = await get_full_table(database_id)
+        if not full_table:
+            print("No entries retrieved from the database.")
+            return False
+
+        # Step 2: Filter data for CoinGecko and Binance
+        with run_metrics.stage("filtering"):
+            coingecko_list = filter_for_coingecko(full_table) if prices else []
+            binance_list = filter_for_binance(full_table) if ohlc else []
+        print(f"CoinGecko entries: {len(coingecko_list)}")
+        print(f"Binance entries: {len(binance_list)}")
+
+        # Step 3: Start CoinGecko in the background; symbols only wait for it before their Notion update
+        coingecko_ids = [entry["coingecko_id"] for entry in coingecko_list]
+        coingecko_task = asyncio.create_task(fetch_general_data_stage(coingecko_ids))
+
+        # Group the entries by symbol; entries without a watchlisted symbol only need CoinGecko
+        symbols = list(dict.fromkeys(entry["binance_id"] for entry in binance_list))
+        entries_by_symbol = {symbol: [] for symbol in symbols}
+        other_entries = []
+        for entry in full_table:
+            _, binance_id = entry_api_ids(entry)
+            if binance_id in entries_by_symbol:
+                entries_by_symbol[binance_id].append(entry)
             else:
-                print(f"No updates needed for page {page_id}.")
-        
-        await asyncio.gather(*update_tasks)
+                other_entries.append(entry)
+
+        pipeline = {"executor": None, "states": {}, "symbol_states": {}, "candles": {}, "results": [], "failed": []}
+        if ohlc:
+            # The analysis stack (pandas and the indicator modules) is only imported for the OHLC stage
+            from analysis_pool import ANALYSIS_WORKERS, INDICATOR_SOURCES, index_states
+            from indicator_state import INDICATOR_MODE, load_state, save_state
+
+            if ANALYSIS_WORKERS > 1:
+                executor = ProcessPoolExecutor(max_workers=ANALYSIS_WORKERS)
+            pipeline["executor"] = executor
+            pipeline["states"] = load_state() if INDICATOR_MODE == "incremental" else {}
+            pipeline["symbol_states"] = index_states(pipeline["states"])
+            pipeline["candles"] = {timeframe: {} for timeframe in INDICATOR_SOURCES.values()}
+        # Without the OHLC stage, entries keep their trend properties
+        other_tables = EMPTY_INDICATOR_TABLES if ohlc else None
+
+        # Steps 4-6: stream every symbol from Binance to Notion
+        # The stages overlap: the wall time is recorded once as "streaming", while "binance" and
+        # "notion_writes" keep their request counters and per-symbol or per-page latencies
+        print(f"Streaming {len(symbols)} symbols from Binance to Notion...")
+        start = time.perf_counter()
+        with (
+            run_metrics.stage("streaming"),
+            run_metrics.stage("binance", binance_limiter, timed=False),
+            run_metrics.stage("notion_writes", notion_limiter, timed=False),
+        ):
+            session = get_async_session()
+            await asyncio.gather(
+                *(process_symbol(session, symbol, entries_by_symbol[symbol], coingecko_task, pipeline)
+                  for symbol in symbols),
+                update_entries(other_entries, coingecko_task, other_tables, pipeline["results"]),
+            )
+        summary = summarize_writes(pipeline["results"], time.perf_counter() - start, notion_limiter)
+
+        if ohlc:
+            if INDICATOR_MODE == "incremental":
+                save_state(pipeline["states"])
+            with run_metrics.stage("transform"):
+                export_candles(pipeline["candles"], filename_prefix="crypto_ohlc")
+
+        # Like the staged flow, the run fails when no symbol could be analyzed, not when a few could not
+        no_symbol_analyzed = symbols and len(pipeline["failed"]) == len(symbols)
+        if no_symbol_analyzed or (coingecko_ids and not coingecko_task.result()) or summary["failed"]:
+            print("Workflow completed with errors.")
+            return False
         print("Workflow completed successfully!")
+        return True
 
     except Exception as e:
         print(f"An error occurred in the main function: {e}")
+        return False
+
+    finally:
+        if executor is not None:
+            executor.shutdown()
+        # Report where the time went, including runs that stopped early
+        run_metrics.count_since("http", transport_before, transport_stats())
+        run_metrics.write()
+
+async def main(prices=True, ohlc=True):
+    """
+    Main function to orchestrate the program, pipelined or staged depending on ASYNC_MAIN_MODE.
+    - prices: refresh the CoinGecko market data (price, market cap, volume, changes).
+    - ohlc: refresh the Binance trend and momentum properties.
+    A prices-only run never imports pandas (see cli.py).
+    Returns True when the run completed without errors, False otherwise.
+    """
+    if ASYNC_MAIN_MODE == "staged":
+        return await main_staged(prices, ohlc)
+    return await main_pipelined(prices, ohlc)
 
 
 if __name__ == "__main__":
-    asyncio.run(main())
+    sys.exit(0 if asyncio.run(closing_transport(main())) else 1)
@@ -0,0 +1,199 @@
+"""
+Microbenchmarks for the transform and indicator hot paths of app.py and app_async.py.
+
+Deterministic synthetic klines (a seeded random walk, one year of hourly candles per symbol)
+are generated at several scales. Each case is timed (best of --repeat runs) and its peak
+memory is measured with tracemalloc in a separate run.
+
+    python benchmark.py                                   # 10 and 100 symbols
+    python benchmark.py --scales 10,100,1000 --output baseline.json
+    python benchmark.py --compare baseline.json           # exit code 1 on regression
+"""
+import argparse
+import json
+import platform
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+import numpy as np
+import pandas as pd
+from indicators import build_indicator_tables
+from kline_store import KLINE_DTYPE
+from rollups import ROLLUPS, aggregate
+
+# One year of hourly candles, starting on 2024-01-01 00:00 UTC
+HOURS = 365 * 24
+START_MS = 1_704_067_200_000
+HOUR_MS = 3_600_000
+
+# Slowdown tolerated against the baseline before a case is reported as a regression
+DEFAULT_TOLERANCE = 1.25
+
+def synthetic_klines(symbols, hours=HOURS, seed=42):
+    """
+    Build deterministic KLINE_DTYPE candles for `symbols` symbols (SYM0USDT, SYM1USDT, ...).
+    Closes follow a seeded geometric random walk, so every run sees the same data.
+    """
+    rng = np.random.default_rng(seed)
+    open_times = START_MS + np.arange(hours, dtype=np.int64) * HOUR_MS
+    data = {}
+    for i in range(symbols):
+        closes = 100 * np.exp(np.cumsum(rng.normal(0, 0.01, hours)))
+        opens = np.concatenate([[closes[0]], closes[:-1]])
+        spread = np.abs(rng.normal(0, 0.005, hours)) * closes
+        candles = np.empty(hours, dtype=KLINE_DTYPE)
+        candles["open_time"] = open_times
+        candles["open"] = opens
+        candles["high"] = np.maximum(opens, closes) + spread
+        candles["low"] = np.minimum(opens, closes) - spread
+        candles["close"] = closes
+        candles["volume"] = rng.uniform(10, 1000, hours)
+        data[f"SYM{i}USDT"] = candles
+    return data
+
+def resample(combined_df, rule):
+    """
+    Resample the indexed hourly DataFrame per symbol, as transform_and_save_multi does in resample mode.
+    """
+    return combined_df.groupby("symbol", observed=True).resample(rule).agg({
+        "open": "first",
+        "high": "max",
+        "low": "min",
+        "close": "last",
+        "volume": "sum"
+    }).reset_index()
+
+def filter_symbols(frames, symbols):
+    """
+    Per-symbol boolean filtering of each timeframe, as main() used to do for every Notion entry.
+    """
+    return [df[df["symbol"] == symbol] for symbol in symbols for df in frames]
+
+def analyze_symbols(analyze_fn, frames, symbols):
+    """
+    Run one analysis function on every symbol of every timeframe (pre-split, so only the analysis is timed).
+    """
+    groups = [dict(tuple(df.groupby("symbol", sort=False, observed=True))) for df in frames]
+    def run():
+        return [analyze_fn(by_symbol[symbol]) for symbol in symbols for by_symbol in groups]
+    return run
+
+def measure(fn, repeat):
+    """
+    Return the best wall time over `repeat` runs and the peak traced memory (MB) of one extra run.
+    """
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - start)
+
+    tracemalloc.start()
+    try:
+        fn()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return min(timings), peak / 1_048_576
+
+def bench_cases(apps, data, workdir):
+    """
+    Yield (module, case, callable) for every benchmark case at one scale.
+    """
+    symbols = list(data)
+
+    # Frames shared by the analysis cases, built once per scale
+    hourly_df, daily_df, weekly_df = apps[0].transform_and_save_multi(
+        data, export_format="none", rollup_mode="resample"
+    )
+    frames = (hourly_df, daily_df, weekly_df)
+    combined_df = hourly_df.set_index("timestamp")
+
+    for app in apps:
+        name = app.__name__
+        yield name, "transform_and_save_multi[resample]", lambda app=app: app.transform_and_save_multi(
+            data, export_format="none", rollup_mode="resample")
+        # A fresh archive directory each run measures the full rollup build
+        yield name, "transform_and_save_multi[incremental]", lambda app=app: app.transform_and_save_multi(
+            data, export_format="none", rollup_mode="incremental", archive_dir=tempfile.mkdtemp(dir=workdir))
+        yield name, "per_symbol_filtering", lambda: filter_symbols(frames, symbols)
+        yield name, "analyze_trend", analyze_symbols(app.analyze_trend, frames, symbols)
+        yield name, "analyze_momentum", analyze_symbols(app.analyze_momentum, frames, symbols)
+
+    # Cases that do not depend on the entry point
+    yield "shared", "resample_daily", lambda: resample(combined_df, "1D")
+    yield "shared", "resample_weekly", lambda: resample(combined_df, "1W")
+    yield "shared", "rollups_aggregate", lambda: [
+        aggregate(candles, label_fn(candles["open_time"]))
+        for candles in data.values() for label_fn in ROLLUPS.values()
+    ]
+    yield "shared", "build_indicator_tables", lambda: build_indicator_tables(hourly_df, daily_df, weekly_df)
+
+def compare(results, baseline_path, tolerance):
+    """
+    Compare the timings with a baseline file and return the cases slower than `tolerance` times the baseline.
+    """
+    with open(baseline_path) as f:
+        baseline = {
+            (r["module"], r["case"], r["symbols"]): r["seconds"] for r in json.load(f)["results"]
+        }
+
+    regressions = []
+    for r in results:
+        reference = baseline.get((r["module"], r["case"], r["symbols"]))
+        if reference and r["seconds"] > reference * tolerance:
+            regressions.append((r, reference))
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the OHLC transform and indicator hot paths.")
+    parser.add_argument("--scales", default="10,100", help="comma-separated symbol counts (e.g. 10,100,1000)")
+    parser.add_argument("--repeat", type=int, default=3, help="timed runs per case, the best one is kept")
+    parser.add_argument("--apps", default="app,app_async", help="entry points to benchmark")
+    parser.add_argument("--output", help="write the results to this JSON file (e.g. a new baseline)")
+    parser.add_argument("--compare", help="baseline JSON file to check for regressions")
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE,
+                        help="slowdown factor reported as a regression")
+    args = parser.parse_args()
+
+    apps = [__import__(name) for name in args.apps.split(",")]
+
+    results = []
+    workdir = tempfile.mkdtemp(prefix="ohlc_bench_")
+    print(f"{'module':<10} {'case':<40} {'symbols':>7} {'seconds':>10} {'peak MB':>10}")
+    try:
+        for scale in (int(s) for s in args.scales.split(",")):
+            data = synthetic_klines(scale)
+            for module, case, fn in bench_cases(apps, data, workdir):
+                seconds, peak_mb = measure(fn, args.repeat)
+                results.append({"module": module, "case": case, "symbols": scale,
+                                "seconds": round(seconds, 6), "peak_mb": round(peak_mb, 3)})
+                print(f"{module:<10} {case:<40} {scale:>7} {seconds:>10.4f} {peak_mb:>10.1f}")
+    finally:
+        # Remove the rollup archives written by the incremental cases
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({
+                "python": platform.python_version(),
+                "numpy": np.__version__,
+                "pandas": pd.__version__,
+                "platform": platform.platform(),
+                "results": results,
+            }, f, indent=2)
+        print(f"Results saved to {args.output}")
+
+    if args.compare:
+        regressions = compare(results, args.compare, args.tolerance)
+        for r, reference in regressions:
+            print(f"Regression: {r['module']} {r['case']} ({r['symbols']} symbols) "
+                  f"{r['seconds']:.4f}s vs {reference:.4f}s baseline")
+        if regressions:
+            sys.exit(1)
+        print("No regression against the baseline.")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,56 @@
+"""
+Command-line entry point with a fast start-up: each command only imports what its stages need.
+
+    python cli.py prices            # Notion read -> CoinGecko -> Notion update, without pandas
+    python cli.py ohlc              # Binance OHLC analysis only (trend and momentum properties)
+    python cli.py full              # both, like app.py
+    python cli.py prices --async    # the same stages through app_async.py
+    python cli.py stream            # live trends from the Binance kline WebSocket streams (kline_stream.py)
+
+The prices command is cheap enough to run every minute from cron, next to an hourly ohlc/full run.
+The exit status is 1 when the run did not complete (see app.main).
+"""
+import argparse
+import sys
+
+# Stages run by each command (keyword arguments of app.main / app_async.main)
+COMMANDS = {
+    "prices": {"prices": True, "ohlc": False},
+    "ohlc": {"prices": False, "ohlc": True},
+    "full": {"prices": True, "ohlc": True},
+}
+
+COMMAND_HELP = {
+    "prices": "refresh the CoinGecko market data only (no pandas, no Binance)",
+    "ohlc": "refresh the Binance trend and momentum properties only",
+    "full": "refresh everything",
+}
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Update the Notion portfolio with market data.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    for command in COMMANDS:
+        subparser = subparsers.add_parser(command, help=COMMAND_HELP[command])
+        subparser.add_argument("--async", dest="use_async", action="store_true",
+                               help="run through app_async.py instead of app.py")
+    subparsers.add_parser("stream", help="keep the trends current from the Binance kline streams")
+    args = parser.parse_args(argv)
+
+    # The entry points are only imported once the command is known
+    if args.command == "stream":
+        import asyncio
+        import kline_stream
+        asyncio.run(kline_stream.run_stream())
+        return True
+    elif args.use_async:
+        import asyncio
+        import app_async
+        from http_transport import closing_transport
+        return asyncio.run(closing_transport(app_async.main(**COMMANDS[args.command])))
+    else:
+        import app
+        return app.main(**COMMANDS[args.command])
+
+if __name__ == "__main__":
+    # A non-zero exit status lets cron and supervisors notice failed runs
+    sys.exit(0 if main() else 1)
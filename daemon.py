@@ -0,0 +1,172 @@
+"""
+Resident service mode: run the pipeline right after every candle close instead of from cron.
+
+The interpreter, imports, Notion client, pooled HTTP connections, Notion snapshot (connection and
+decoded pages) and indicator state stay warm between runs, so each wake-up only performs the
+incremental refresh. The candle archive and the CoinGecko cache are still read from disk.
+A small HTTP endpoint reports health and status.
+
+    python daemon.py                       # app_async.py, hourly, health on 127.0.0.1:8080
+    DAEMON_APP=app python daemon.py        # the sync entry point, run in a worker thread
+"""
+import asyncio
+import importlib
+import os
+import signal
+import time
+from aiohttp import web
+from http_transport import close_async_session, close_session
+from kline_store import interval_to_ms
+from notion_snapshot import close_snapshots
+
+# Entry point run on every wake-up: "app_async" or "app"
+DAEMON_APP = os.getenv("DAEMON_APP", "app_async")
+
+# Candle interval the runs are aligned to, and the delay after each close before running
+DAEMON_INTERVAL = os.getenv("DAEMON_INTERVAL", "1h")
+DAEMON_CLOSE_DELAY = float(os.getenv("DAEMON_CLOSE_DELAY", "5"))
+
+# Run once at start-up instead of waiting for the next close
+DAEMON_RUN_AT_START = os.getenv("DAEMON_RUN_AT_START", "1") == "1"
+
+# Address of the health/status endpoint
+DAEMON_HEALTH_HOST = os.getenv("DAEMON_HEALTH_HOST", "127.0.0.1")
+DAEMON_HEALTH_PORT = int(os.getenv("DAEMON_HEALTH_PORT", "8080"))
+
+def next_run_time(now, interval, delay=DAEMON_CLOSE_DELAY):
+    """
+    Return the time (in seconds) of the next run: the next candle close plus the delay.
+    """
+    interval_seconds = interval_to_ms(interval) / 1000
+    next_close = (now // interval_seconds + 1) * interval_seconds
+    return next_close + delay
+
+def iso_time(timestamp):
+    """
+    Format a Unix timestamp as an ISO 8601 UTC string (None stays None).
+    """
+    if timestamp is None:
+        return None
+    return time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime(timestamp))
+
+def is_healthy(status, now, interval):
+    """
+    The service is healthy while runs keep completing: the last successful run (or the
+    start-up, before the first one) is no older than two intervals.
+    """
+    reference = status["last_success"] or status["started"]
+    return now - reference <= 2 * interval_to_ms(interval) / 1000 + DAEMON_CLOSE_DELAY
+
+async def run_once(app, status):
+    """
+    Run the entry point once and record the outcome in the status: main() returns whether the run
+    completed, since it reports and swallows its own errors.
+    The sync entry point runs in a worker thread so the health endpoint stays responsive.
+    """
+    status["state"] = "running"
+    status["last_started"] = time.time()
+    try:
+        if asyncio.iscoroutinefunction(app.main):
+            completed = await app.main()
+        else:
+            completed = await asyncio.to_thread(app.main)
+        if completed:
+            status["last_success"] = time.time()
+            status["last_error"] = None
+        else:
+            # main() reports its own errors and returns False when the run did not complete
+            status["failures"] += 1
+            status["last_error"] = "Run did not complete, see the log for details"
+    except Exception as e:
+        # main() already reports its own errors; anything reaching here is unexpected
+        status["failures"] += 1
+        status["last_error"] = str(e)
+        print(f"Daemon run failed: {e}")
+    finally:
+        status["runs"] += 1
+        status["last_finished"] = time.time()
+        status["last_metrics"] = app.run_metrics.snapshot()
+        status["state"] = "idle"
+
+def status_handler(status, interval):
+    """
+    Build the GET /health handler: 200 when healthy, 503 otherwise, with the status as JSON.
+    """
+    async def handler(request):
+        now = time.time()
+        healthy = is_healthy(status, now, interval)
+        body = {
+            "healthy": healthy,
+            "app": status["app"],
+            "state": status["state"],
+            "interval": interval,
+            "runs": status["runs"],
+            "failures": status["failures"],
+            "started_at": iso_time(status["started"]),
+            "last_started_at": iso_time(status["last_started"]),
+            "last_finished_at": iso_time(status["last_finished"]),
+            "last_success_at": iso_time(status["last_success"]),
+            "last_error": status["last_error"],
+            "next_run_at": iso_time(status["next_run"]),
+            "last_metrics": status["last_metrics"],
+        }
+        return web.json_response(body, status=200 if healthy else 503)
+    return handler
+
+async def serve(app_name=DAEMON_APP, interval=DAEMON_INTERVAL, run_at_start=DAEMON_RUN_AT_START,
+                host=DAEMON_HEALTH_HOST, port=DAEMON_HEALTH_PORT):
+    """
+    Run the entry point after every candle close until SIGINT/SIGTERM, serving /health meanwhile.
+    """
+    app = importlib.import_module(app_name)
+    status = {
+        "app": app_name,
+        "state": "idle",
+        "runs": 0,
+        "failures": 0,
+        "started": time.time(),
+        "last_started": None,
+        "last_finished": None,
+        "last_success": None,
+        "last_error": None,
+        "next_run": None,
+        "last_metrics": None,
+    }
+
+    health = web.Application()
+    health.add_routes([web.get("/health", status_handler(status, interval))])
+    runner = web.AppRunner(health)
+    await runner.setup()
+    await web.TCPSite(runner, host, port).start()
+    print(f"Daemon started ({app_name}, every {interval} close). Health endpoint on http://{host}:{port}/health")
+
+    # Stop cleanly between runs on SIGINT/SIGTERM
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        try:
+            loop.add_signal_handler(sig, stop.set)
+        except NotImplementedError:
+            pass  # Signal handlers are not available on Windows event loops
+
+    try:
+        if run_at_start:
+            await run_once(app, status)
+
+        while not stop.is_set():
+            status["next_run"] = next_run_time(time.time(), interval)
+            print(f"Next run at {iso_time(status['next_run'])}")
+            try:
+                await asyncio.wait_for(stop.wait(), timeout=max(0.0, status["next_run"] - time.time()))
+            except asyncio.TimeoutError:
+                await run_once(app, status)
+    finally:
+        await runner.cleanup()
+        # The pooled HTTP sessions and the snapshot stay open between runs and are only closed here
+        await close_async_session()
+        close_session()
+        close_snapshots()
+        print("Daemon stopped.")
+
+if __name__ == "__main__":
+    asyncio.run(serve())
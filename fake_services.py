@@ -0,0 +1,477 @@
+"""
+Local stand-ins for the Binance, CoinGecko and Notion endpoints used by the pipeline.
+
+Serves /api/v3/klines, /api/v3/coins/markets, the Notion database retrieve/query and the
+page update on one port, with configurable latency, pagination, 429 bursts and failures.
+Point the apps at it with BINANCE_BASE_URL, COINGECKO_BASE_URL and NOTION_BASE_URL.
+The /stream WebSocket stands in for the Binance combined kline streams (BINANCE_STREAM_URL=ws://...):
+it replays a recording (kline_stream.py --record) or generates candles from the same price series.
+
+    python fake_services.py --pages 2000 --latency 0.02                 # serve on port 8765
+    python fake_services.py --pages 2000 --throttle-every 50 --run both # compare app.py and app_async.py
+    python fake_services.py --pages 20 --stream-delay 5                 # one candle close every 5 seconds
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from aiohttp import web
+from kline_store import interval_to_ms
+from notion_query import PIPELINE_PROPERTIES
+
+# Endpoint groups that can be throttled or failed
+FAULT_ENDPOINTS = ("klines", "markets", "query", "pages")
+
+# Default configuration of the stand-ins
+DEFAULT_CONFIG = {
+    "pages": 100,  # Number of Notion pages (one coin per page)
+    "latency": 0.0,  # Seconds added to every response
+    "jitter": 0.0,  # Random extra latency, up to this many seconds
+    "notion_page_size": 100,  # Maximum results per Notion query page
+    "throttle_every": 0,  # Every N-th faultable request starts a burst of 429s (0 disables)
+    "throttle_burst": 1,  # Number of consecutive 429 responses in a burst
+    "retry_after": 1,  # Retry-After header of the 429 responses, in seconds
+    "failure_rate": 0.0,  # Probability of a 500 response on a faultable request
+    "fault_endpoints": ["klines", "markets", "pages"],  # Endpoint groups subject to 429s and failures
+    "seed": 0,  # Seed of the latency jitter and failure draws
+    "stream_delay": 1.0,  # Seconds between two generated candle closes on /stream
+    "stream_updates": 2,  # In-progress updates sent before each generated close
+    "stream_replay": None,  # JSON-lines recording replayed on /stream instead of generated candles
+    "stream_speed": 60.0,  # Speed-up of the recorded event times when replaying
+    "stream_drop_after": 0,  # Close each stream connection after this many messages (0 disables)
+}
+
+# Binance request weight of one klines call
+KLINES_WEIGHT = 2
+
+def make_page(index):
+    """
+    Build a watchlisted Notion page for coin `index`, with every property the pipeline reads.
+    """
+    def rich_text(value):
+        return {"rich_text": [{"type": "text", "text": {"content": value}, "plain_text": value}]}
+
+    properties = {
+        "Symbol": {"title": [{"type": "text", "text": {"content": f"COIN{index}"}, "plain_text": f"COIN{index}"}]},
+        "Watchlist General": {"formula": {"type": "boolean", "boolean": True}},
+        "Watchlist OHLC": {"formula": {"type": "boolean", "boolean": True}},
+        "ID API Coingecko": rich_text(f"coin-{index}"),
+        "ID API Binance": rich_text(f"COIN{index}USDT"),
+    }
+    return {
+        "object": "page",
+        "id": f"00000000-0000-0000-0000-{index:012d}",
+        "last_edited_time": "2024-01-01T00:00:00.000Z",
+        "properties": properties,
+    }
+
+def fake_price(symbol, open_time, interval_ms):
+    """
+    Deterministic price of a symbol at a candle, a slow wave around a per-symbol level.
+    """
+    level = 10 + sum(symbol.encode()) % 90
+    step = open_time // interval_ms
+    return level * (1 + 0.05 * ((step % 48) - 24) / 24)
+
+def make_klines(symbol, interval, start_time, end_time, limit, now_ms):
+    """
+    Build raw Binance kline rows between start_time and end_time, aligned on the interval.
+    """
+    interval_ms = interval_to_ms(interval)
+    end_time = min(end_time, now_ms)
+    if start_time is None:
+        start_time = end_time - (limit - 1) * interval_ms
+    open_time = -(-start_time // interval_ms) * interval_ms
+
+    rows = []
+    while open_time <= end_time and len(rows) < limit:
+        price = fake_price(symbol, open_time, interval_ms)
+        rows.append([
+            open_time, f"{price:.4f}", f"{price * 1.01:.4f}", f"{price * 0.99:.4f}", f"{price * 1.002:.4f}",
+            "1000.0", open_time + interval_ms - 1, "0", 100, "0", "0", "0",
+        ])
+        open_time += interval_ms
+    return rows
+
+def parse_stream_name(name):
+    """
+    Split a combined-stream name ("coin0usdt@kline_1h") into the symbol and the interval.
+    """
+    symbol, kind = name.split("@", 1)
+    return symbol.upper(), kind.split("_", 1)[1]
+
+def kline_event(symbol, interval, open_time, closed):
+    """
+    Build a combined-stream kline message for one candle of the deterministic price series.
+    In-progress updates are timed in the middle of the candle, closes right after it.
+    """
+    row = make_klines(symbol, interval, open_time, open_time, 1, open_time)[0]
+    return {
+        "stream": f"{symbol.lower()}@kline_{interval}",
+        "data": {
+            "e": "kline",
+            "E": row[6] + 1 if closed else open_time + interval_to_ms(interval) // 2,
+            "s": symbol,
+            "k": {"t": row[0], "T": row[6], "s": symbol, "i": interval, "o": row[1], "c": row[4],
+                  "h": row[2], "l": row[3], "v": row[5], "n": row[8], "x": closed},
+        },
+    }
+
+def load_replay(path, streams, now_ms):
+    """
+    Load the messages of a recording for the subscribed streams.
+    Each stream is shifted in time so that its first recorded candle is the current one,
+    which keeps the replay contiguous with the candles served by /api/v3/klines.
+    """
+    with open(path) as f:
+        messages = [json.loads(line) for line in f if line.strip()]
+    messages = [message for message in messages if message.get("stream") in streams]
+
+    shifts = {}
+    for message in messages:
+        kline = message["data"]["k"]
+        if message["stream"] not in shifts:
+            interval_ms = interval_to_ms(kline["i"])
+            shifts[message["stream"]] = now_ms // interval_ms * interval_ms - kline["t"]
+
+    for message in messages:
+        shift = shifts[message["stream"]]
+        message["data"]["E"] += shift
+        message["data"]["k"]["t"] += shift
+        message["data"]["k"]["T"] += shift
+    return messages
+
+def make_market(coin_id):
+    """
+    Build one /coins/markets item for a CoinGecko id.
+    """
+    price = 10 + sum(coin_id.encode()) % 90
+    return {
+        "id": coin_id,
+        "current_price": price,
+        "market_cap": price * 1_000_000,
+        "fully_diluted_valuation": price * 1_200_000,
+        "total_volume": price * 50_000,
+        "price_change_percentage_24h": 1.5,
+        "price_change_percentage_7d_in_currency": -2.0,
+        "price_change_percentage_30d_in_currency": 4.0,
+    }
+
+def matches_filter(page, query_filter):
+    """
+    Apply the part of a Notion filter the stand-in understands: last_edited_time on_or_after.
+    Property filters are accepted and treated as matching, since every fake page is watchlisted.
+    """
+    if not query_filter or query_filter.get("timestamp") != "last_edited_time":
+        return True
+    threshold = query_filter["last_edited_time"].get("on_or_after")
+    return threshold is None or page["last_edited_time"] >= threshold
+
+def error_body(group, status):
+    """
+    Build an error response body shaped like the real API of the endpoint group.
+    """
+    if group == "klines":
+        return {"code": -1003, "msg": "Too many requests."} if status == 429 else {"code": -1000, "msg": "Unknown error."}
+    if group == "markets":
+        return {"status": {"error_code": status, "error_message": "Fake CoinGecko error"}}
+    code = "rate_limited" if status == 429 else "internal_server_error"
+    return {"object": "error", "status": status, "code": code, "message": "Fake Notion error"}
+
+def create_app(config=None):
+    """
+    Build the aiohttp application serving the fake endpoints.
+    Request counters are exposed on GET /stats and cleared with POST /stats/reset.
+    """
+    config = dict(DEFAULT_CONFIG, **(config or {}))
+    app = web.Application()
+    app["config"] = config
+    app["rng"] = random.Random(config["seed"])
+    app["pages"] = {page["id"]: page for page in (make_page(i) for i in range(config["pages"]))}
+    # Mutable counters, kept in one dict since the application itself is frozen once started
+    app["state"] = {
+        "stats": {},  # Request counters of each endpoint group
+        "weight": {},  # Binance weight used in the current minute
+        "faultable": 0,  # Requests seen by the faultable endpoints
+        "stream_cursors": {},  # Open time of the next generated candle of each stream
+        "replay_positions": {},  # Next replayed message of each subscription
+    }
+    state = app["state"]
+
+    def count(group, key):
+        group_stats = state["stats"].setdefault(group, {"requests": 0, "throttled": 0, "failed": 0})
+        group_stats[key] = group_stats.get(key, 0) + 1
+
+    async def with_faults(request, group, handler):
+        """
+        Count the request, add latency and inject 429s or failures before calling the handler.
+        """
+        count(group, "requests")
+        delay = config["latency"] + app["rng"].uniform(0, config["jitter"])
+        if delay:
+            await asyncio.sleep(delay)
+
+        if group in config["fault_endpoints"]:
+            state["faultable"] += 1
+            every = config["throttle_every"]
+            if every and state["faultable"] % every >= every - config["throttle_burst"]:
+                count(group, "throttled")
+                return web.json_response(error_body(group, 429), status=429,
+                                         headers={"Retry-After": str(config["retry_after"])})
+            if app["rng"].random() < config["failure_rate"]:
+                count(group, "failed")
+                return web.json_response(error_body(group, 500), status=500)
+        return await handler(request)
+
+    async def klines(request):
+        query = request.query
+        now_ms = int(time.time() * 1000)
+        start_time = int(query["startTime"]) if "startTime" in query else None
+        end_time = int(query.get("endTime", now_ms))
+        limit = min(int(query.get("limit", 500)), 1000)
+        rows = make_klines(query["symbol"], query.get("interval", "1h"), start_time, end_time, limit, now_ms)
+
+        minute = now_ms // 60_000
+        state["weight"] = {minute: state["weight"].get(minute, 0) + KLINES_WEIGHT}
+        return web.json_response(rows, headers={"X-MBX-USED-WEIGHT-1M": str(state["weight"][minute])})
+
+    async def markets(request):
+        query = request.query
+        ids = [coin_id for coin_id in query.get("ids", "").split(",") if coin_id]
+        per_page = int(query.get("per_page", 100))
+        page = int(query.get("page", 1))
+        selected = ids[(page - 1) * per_page:page * per_page]
+        return web.json_response([make_market(coin_id) for coin_id in selected])
+
+    async def retrieve_database(request):
+        properties = {name: {"id": f"p{index}", "name": name} for index, name in enumerate(PIPELINE_PROPERTIES)}
+        return web.json_response({"object": "database", "id": request.match_info["database_id"],
+                                  "properties": properties})
+
+    async def query_database(request):
+        body = await request.json() if request.can_read_body else {}
+        page_size = min(int(body.get("page_size", config["notion_page_size"])), config["notion_page_size"])
+        pages = [page for page in app["pages"].values() if matches_filter(page, body.get("filter"))]
+
+        start = int(body.get("start_cursor") or 0)
+        results = pages[start:start + page_size]
+        has_more = start + page_size < len(pages)
+        return web.json_response({
+            "object": "list",
+            "results": results,
+            "has_more": has_more,
+            "next_cursor": str(start + page_size) if has_more else None,
+        })
+
+    async def update_page(request):
+        page = app["pages"].get(request.match_info["page_id"])
+        if page is None:
+            return web.json_response({"object": "error", "status": 404, "code": "object_not_found",
+                                      "message": "Page not found"}, status=404)
+        body = await request.json()
+        page["properties"].update(body.get("properties", {}))
+        page["last_edited_time"] = time.strftime("%Y-%m-%dT%H:%M:%S.000Z", time.gmtime())
+        count("pages", "updated")
+        return web.json_response(page)
+
+    async def generated_messages(streams):
+        """
+        Yield (delay, message) pairs: a few in-progress updates, then the close, of each stream in turn.
+        """
+        cursors = state["stream_cursors"]
+        now_ms = int(time.time() * 1000)
+        for name in streams:
+            interval_ms = interval_to_ms(parse_stream_name(name)[1])
+            cursors.setdefault(name, now_ms // interval_ms * interval_ms)
+
+        steps = config["stream_updates"] + 1
+        while True:
+            for step in range(steps):
+                for index, name in enumerate(streams):
+                    symbol, interval = parse_stream_name(name)
+                    delay = config["stream_delay"] / steps if index == 0 else 0
+                    yield delay, kline_event(symbol, interval, cursors[name], closed=step == steps - 1)
+            for name in streams:
+                cursors[name] += interval_to_ms(parse_stream_name(name)[1])
+
+    async def replayed_messages(streams):
+        """
+        Yield (delay, message) pairs of the recording, paced by the recorded event times.
+        A reconnecting subscription resumes where it stopped.
+        """
+        messages = load_replay(config["stream_replay"], set(streams), int(time.time() * 1000))
+        key = "/".join(streams)
+        position = state["replay_positions"].get(key, 0)
+        previous = messages[position - 1]["data"]["E"] if position else None
+        for message in messages[position:]:
+            event_time = message["data"]["E"]
+            delay = max(0, event_time - previous) / 1000 / config["stream_speed"] if previous else 0
+            previous = event_time
+            state["replay_positions"][key] = state["replay_positions"].get(key, 0) + 1
+            yield delay, message
+
+    async def kline_stream(request):
+        streams = [name for name in request.query.get("streams", "").split("/") if name]
+        ws = web.WebSocketResponse()
+        await ws.prepare(request)
+        count("stream", "connections")
+
+        source = replayed_messages(streams) if config["stream_replay"] else generated_messages(streams)
+        sent = 0
+        async for delay, message in source:
+            if delay:
+                await asyncio.sleep(delay)
+            if ws.closed:
+                break
+            try:
+                await ws.send_str(json.dumps(message))
+            except ConnectionResetError:
+                break  # The client went away
+            count("stream", "messages")
+            sent += 1
+            if config["stream_drop_after"] and sent >= config["stream_drop_after"]:
+                count("stream", "dropped")
+                await ws.close()
+                return ws
+
+        # Keep the connection open once the recording is exhausted
+        async for _ in ws:
+            pass
+        return ws
+
+    async def stats(request):
+        return web.json_response(state["stats"])
+
+    async def reset_stats(request):
+        state["stats"].clear()
+        return web.json_response({})
+
+    def route(group, handler):
+        return lambda request: with_faults(request, group, handler)
+
+    app.add_routes([
+        web.get("/api/v3/klines", route("klines", klines)),
+        web.get("/api/v3/coins/markets", route("markets", markets)),
+        web.get("/v1/databases/{database_id}", route("query", retrieve_database)),
+        web.post("/v1/databases/{database_id}/query", route("query", query_database)),
+        web.patch("/v1/pages/{page_id}", route("pages", update_page)),
+        web.get("/stream", kline_stream),
+        web.get("/stats", stats),
+        web.post("/stats/reset", reset_stats),
+    ])
+    return app
+
+def start_in_thread(config=None, host="127.0.0.1", port=8765):
+    """
+    Serve the fake endpoints from a background thread.
+    Returns the aiohttp application (for its counters) and a function stopping the server.
+    """
+    app = create_app(config)
+    loop = asyncio.new_event_loop()
+    runner = web.AppRunner(app)
+    started = threading.Event()
+
+    def serve():
+        asyncio.set_event_loop(loop)
+        loop.run_until_complete(runner.setup())
+        loop.run_until_complete(web.TCPSite(runner, host, port).start())
+        started.set()
+        loop.run_forever()
+
+    thread = threading.Thread(target=serve, daemon=True)
+    thread.start()
+    started.wait()
+
+    def stop():
+        asyncio.run_coroutine_threadsafe(runner.cleanup(), loop).result()
+        loop.call_soon_threadsafe(loop.stop)
+        thread.join()
+
+    return app, stop
+
+def run_entry_point(script, config, host="127.0.0.1", port=8765):
+    """
+    Run one entry point (app.py or app_async.py) end to end against fresh stand-ins,
+    in a clean working directory so no archive, snapshot or cache is reused.
+    Returns the elapsed time, the exit code and the request counters of each endpoint group.
+    """
+    app, stop = start_in_thread(config, host, port)
+    base_url = f"http://{host}:{port}"
+    env = dict(
+        os.environ,
+        BINANCE_BASE_URL=base_url,
+        COINGECKO_BASE_URL=base_url,
+        NOTION_BASE_URL=base_url,
+        NOTION_API_KEY="fake-key",
+        NOTION_DATABASE_ID="fake-database",
+    )
+    script_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), script)
+
+    try:
+        start = time.perf_counter()
+        completed = subprocess.run([sys.executable, script_path], env=env, cwd=tempfile.mkdtemp(prefix="fake_run_"),
+                                   stdout=subprocess.DEVNULL)
+        elapsed = time.perf_counter() - start
+    finally:
+        stop()
+    return {"script": script, "elapsed_seconds": round(elapsed, 3), "exit_code": completed.returncode,
+            "requests": app["state"]["stats"]}
+
+def main():
+    parser = argparse.ArgumentParser(description="Local stand-ins for the Binance, CoinGecko and Notion APIs.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--pages", type=int, default=DEFAULT_CONFIG["pages"])
+    parser.add_argument("--latency", type=float, default=DEFAULT_CONFIG["latency"])
+    parser.add_argument("--jitter", type=float, default=DEFAULT_CONFIG["jitter"])
+    parser.add_argument("--notion-page-size", type=int, default=DEFAULT_CONFIG["notion_page_size"])
+    parser.add_argument("--throttle-every", type=int, default=DEFAULT_CONFIG["throttle_every"])
+    parser.add_argument("--throttle-burst", type=int, default=DEFAULT_CONFIG["throttle_burst"])
+    parser.add_argument("--retry-after", type=int, default=DEFAULT_CONFIG["retry_after"])
+    parser.add_argument("--failure-rate", type=float, default=DEFAULT_CONFIG["failure_rate"])
+    parser.add_argument("--fault-endpoints", default=",".join(DEFAULT_CONFIG["fault_endpoints"]),
+                        help=f"comma-separated groups among {', '.join(FAULT_ENDPOINTS)}")
+    parser.add_argument("--seed", type=int, default=DEFAULT_CONFIG["seed"])
+    parser.add_argument("--stream-delay", type=float, default=DEFAULT_CONFIG["stream_delay"])
+    parser.add_argument("--stream-updates", type=int, default=DEFAULT_CONFIG["stream_updates"])
+    parser.add_argument("--stream-replay", help="JSON-lines recording replayed on /stream (kline_stream.py --record)")
+    parser.add_argument("--stream-speed", type=float, default=DEFAULT_CONFIG["stream_speed"])
+    parser.add_argument("--stream-drop-after", type=int, default=DEFAULT_CONFIG["stream_drop_after"])
+    parser.add_argument("--run", choices=["app", "app_async", "both"],
+                        help="run the pipeline end to end against the stand-ins and report runtime and request counts")
+    args = parser.parse_args()
+
+    config = {
+        "pages": args.pages,
+        "latency": args.latency,
+        "jitter": args.jitter,
+        "notion_page_size": args.notion_page_size,
+        "throttle_every": args.throttle_every,
+        "throttle_burst": args.throttle_burst,
+        "retry_after": args.retry_after,
+        "failure_rate": args.failure_rate,
+        "fault_endpoints": [group for group in args.fault_endpoints.split(",") if group],
+        "seed": args.seed,
+        "stream_delay": args.stream_delay,
+        "stream_updates": args.stream_updates,
+        "stream_replay": args.stream_replay,
+        "stream_speed": args.stream_speed,
+        "stream_drop_after": args.stream_drop_after,
+    }
+
+    if args.run is None:
+        web.run_app(create_app(config), host=args.host, port=args.port)
+        return
+
+    scripts = ["app.py", "app_async.py"] if args.run == "both" else [f"{args.run}.py"]
+    for script in scripts:
+        print(json.dumps(run_entry_point(script, config, args.host, args.port), indent=2))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,301 @@
+"""
+Shared HTTP transport of both entry points: one pooled session per process instead of one per call,
+plus one pooled httpx client for the Notion SDK.
+
+- Keep-alive connection pools per host (HTTP_POOL_SIZE connections each), so later requests,
+  and later runs of a long-lived process (daemon.py), reuse the open TCP/TLS connections.
+- DNS answers are cached for HTTP_DNS_TTL seconds by the aiohttp connector; the requests session
+  only resolves a host when it opens a new connection.
+- gzip/deflate responses, connect and read timeouts (HTTP_CONNECT_TIMEOUT, HTTP_READ_TIMEOUT).
+- One retry policy: connection failures and timeouts are retried here with a jittered exponential
+  backoff (HTTP_MAX_RETRIES, HTTP_BACKOFF_BASE); throttling and 5xx statuses are retried by the
+  rate limiters, which pause the whole API (see rate_limit.py).
+- transport_stats() counts the connections opened and reused, recorded in the run metrics.
+aiohttp and httpx are only imported by the helpers using them, so the sync prices path stays cheap to start.
+"""
+import asyncio
+import atexit
+import os
+import random
+import threading
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+# Connect and read timeouts of every request, in seconds
+HTTP_CONNECT_TIMEOUT = float(os.getenv("HTTP_CONNECT_TIMEOUT", "5"))
+HTTP_READ_TIMEOUT = float(os.getenv("HTTP_READ_TIMEOUT", "30"))
+
+# Keep-alive connections kept open per host, and number of hosts with a pool
+HTTP_POOL_SIZE = int(os.getenv("HTTP_POOL_SIZE", "20"))
+HTTP_POOL_HOSTS = 10
+
+# Seconds an idle async connection stays open (servers usually drop idle connections within minutes)
+HTTP_KEEPALIVE_TIMEOUT = float(os.getenv("HTTP_KEEPALIVE_TIMEOUT", "60"))
+
+# Seconds a resolved address is reused by the async connector
+HTTP_DNS_TTL = int(os.getenv("HTTP_DNS_TTL", "300"))
+
+# Retries of connection failures and timeouts, and their exponential backoff (seconds)
+HTTP_MAX_RETRIES = int(os.getenv("HTTP_MAX_RETRIES", "3"))
+HTTP_BACKOFF_BASE = float(os.getenv("HTTP_BACKOFF_BASE", "0.5"))
+HTTP_BACKOFF_CAP = 10.0
+
+# Headers sent with every request
+HTTP_HEADERS = {"Accept-Encoding": "gzip, deflate"}
+
+# Shared sessions, created on first use (see get_session, get_async_session and the Notion clients)
+session = None
+async_session = None
+async_session_loop = None
+notion_http = None
+async_notion_http = None
+async_notion_http_loop = None
+_session_lock = threading.Lock()
+
+# Connections of the async session (the sync ones are read from the urllib3 pools)
+async_counters = {"connections_opened": 0, "connections_reused": 0, "dns_cache_hits": 0, "dns_cache_misses": 0}
+
+# Connections opened and requests sent by the Notion httpx clients
+notion_counters = {"connections": 0, "requests": 0}
+_notion_counters_lock = threading.Lock()
+
+# httpcore trace events of a new connection and of a request sent
+NOTION_TRACE_EVENTS = {
+    "connection.connect_tcp.complete": "connections",
+    "http11.send_request_headers.complete": "requests",
+    "http2.send_request_headers.complete": "requests",
+}
+
+def backoff_delay(attempt):
+    """
+    Seconds to wait before retry number `attempt` (from 1): exponential, capped, with full jitter
+    so concurrent requests failing together do not retry together.
+    """
+    return random.uniform(0, min(HTTP_BACKOFF_CAP, HTTP_BACKOFF_BASE * 2 ** attempt))
+
+class TimeoutSession(requests.Session):
+    """
+    requests session applying the transport timeouts to every request that does not set its own.
+    """
+
+    def request(self, *args, **kwargs):
+        kwargs.setdefault("timeout", (HTTP_CONNECT_TIMEOUT, HTTP_READ_TIMEOUT))
+        return super().request(*args, **kwargs)
+
+def create_session():
+    """
+    Build a pooled requests session. urllib3 retries failed connections and read timeouts of GET
+    requests; statuses are left to the rate limiters.
+    """
+    retry = Retry(
+        total=HTTP_MAX_RETRIES,
+        status=0,
+        other=0,
+        allowed_methods=frozenset(["GET"]),
+        backoff_factor=HTTP_BACKOFF_BASE,
+        backoff_max=HTTP_BACKOFF_CAP,
+        backoff_jitter=HTTP_BACKOFF_BASE,
+        raise_on_status=False,
+        respect_retry_after_header=False,
+    )
+    adapter = HTTPAdapter(pool_connections=HTTP_POOL_HOSTS, pool_maxsize=HTTP_POOL_SIZE, max_retries=retry)
+    new_session = TimeoutSession()
+    new_session.headers.update(HTTP_HEADERS)
+    new_session.mount("https://", adapter)
+    new_session.mount("http://", adapter)
+    return new_session
+
+def get_session():
+    """
+    Return the shared requests session, creating it on first use. It is shared by the worker threads
+    and its connections are closed when the interpreter exits.
+    """
+    global session
+    with _session_lock:
+        if session is None:
+            session = create_session()
+            atexit.register(close_session)
+        return session
+
+def close_session():
+    """
+    Close the shared requests session, the Notion httpx client and their connections.
+    """
+    global session, notion_http
+    with _session_lock:
+        if session is not None:
+            session.close()
+            session = None
+        if notion_http is not None:
+            notion_http.close()
+            notion_http = None
+
+def count_notion_event(event_name):
+    """
+    Count a connection or request of the Notion httpx clients from an httpcore trace event.
+    """
+    key = NOTION_TRACE_EVENTS.get(event_name)
+    if key is not None:
+        with _notion_counters_lock:
+            notion_counters[key] += 1
+
+def notion_limits():
+    """
+    httpx pool settings of the Notion clients, matching the other sessions.
+    """
+    import httpx
+    return httpx.Limits(max_connections=HTTP_POOL_SIZE, max_keepalive_connections=HTTP_POOL_SIZE,
+                        keepalive_expiry=HTTP_KEEPALIVE_TIMEOUT)
+
+def get_notion_http():
+    """
+    Return the shared httpx client of the sync Notion SDK client (notion_client.Client(client=...)),
+    creating it on first use. httpx retries failed connections; statuses are left to the rate limiter.
+    The Notion SDK sets its own base URL, headers and timeout on the client.
+    """
+    global notion_http
+    import httpx
+
+    def trace(event_name, info):
+        count_notion_event(event_name)
+
+    def add_trace(request):
+        request.extensions["trace"] = trace
+
+    with _session_lock:
+        if notion_http is None:
+            notion_http = httpx.Client(
+                transport=httpx.HTTPTransport(limits=notion_limits(), retries=HTTP_MAX_RETRIES),
+                event_hooks={"request": [add_trace]},
+            )
+            atexit.register(close_session)
+        return notion_http
+
+def trace_connections():
+    """
+    aiohttp trace hooks counting the connections opened and reused and the DNS cache hits.
+    """
+    import aiohttp
+
+    def counter(key):
+        async def hook(session, context, params):
+            async_counters[key] += 1
+        return hook
+
+    trace = aiohttp.TraceConfig()
+    trace.on_connection_create_end.append(counter("connections_opened"))
+    trace.on_connection_reuseconn.append(counter("connections_reused"))
+    trace.on_dns_cache_hit.append(counter("dns_cache_hits"))
+    trace.on_dns_cache_miss.append(counter("dns_cache_misses"))
+    return trace
+
+def get_async_session():
+    """
+    Return the shared aiohttp session of the running event loop, creating it on first use.
+    A session left over from a finished event loop (e.g. a previous asyncio.run) is replaced.
+    """
+    global async_session, async_session_loop
+    import aiohttp
+
+    loop = asyncio.get_running_loop()
+    if async_session is None or async_session.closed or async_session_loop is not loop:
+        connector = aiohttp.TCPConnector(
+            limit=HTTP_POOL_SIZE * HTTP_POOL_HOSTS,
+            limit_per_host=HTTP_POOL_SIZE,
+            ttl_dns_cache=HTTP_DNS_TTL,
+            keepalive_timeout=HTTP_KEEPALIVE_TIMEOUT,
+        )
+        async_session = aiohttp.ClientSession(
+            connector=connector,
+            headers=HTTP_HEADERS,
+            timeout=aiohttp.ClientTimeout(total=None, connect=HTTP_CONNECT_TIMEOUT, sock_read=HTTP_READ_TIMEOUT),
+            trace_configs=[trace_connections()],
+        )
+        async_session_loop = loop
+    return async_session
+
+def get_async_notion_http():
+    """
+    Return the shared httpx client of the async Notion SDK client for the running event loop,
+    creating it on first use. A client left over from a finished event loop is replaced.
+    """
+    global async_notion_http, async_notion_http_loop
+    import httpx
+
+    async def trace(event_name, info):
+        count_notion_event(event_name)
+
+    async def add_trace(request):
+        request.extensions["trace"] = trace
+
+    loop = asyncio.get_running_loop()
+    if async_notion_http is None or async_notion_http.is_closed or async_notion_http_loop is not loop:
+        async_notion_http = httpx.AsyncClient(
+            transport=httpx.AsyncHTTPTransport(limits=notion_limits(), retries=HTTP_MAX_RETRIES),
+            event_hooks={"request": [add_trace]},
+        )
+        async_notion_http_loop = loop
+    return async_notion_http
+
+async def close_async_session():
+    """
+    Close the shared aiohttp session and Notion httpx client of the running event loop and their connections.
+    """
+    global async_session, async_session_loop, async_notion_http, async_notion_http_loop
+    loop = asyncio.get_running_loop()
+    if async_session is not None and async_session_loop is loop:
+        await async_session.close()
+    async_session = None
+    async_session_loop = None
+    if async_notion_http is not None and async_notion_http_loop is loop:
+        await async_notion_http.aclose()
+    async_notion_http = None
+    async_notion_http_loop = None
+
+async def closing_transport(coroutine):
+    """
+    Await a coroutine, then close the shared aiohttp session. For one-shot runs under asyncio.run,
+    which would otherwise end with an unclosed session.
+    """
+    try:
+        return await coroutine
+    finally:
+        await close_async_session()
+
+def transient_errors():
+    """
+    aiohttp exceptions worth retrying: failed or dropped connections and timeouts.
+    """
+    import aiohttp
+    return (aiohttp.ClientConnectionError, asyncio.TimeoutError)
+
+async def retry_connection(error, failures, target):
+    """
+    Wait before retrying a request whose connection failed or timed out (failures counts from 1),
+    or re-raise the error once HTTP_MAX_RETRIES retries were made. The async counterpart of the
+    urllib3 retries of the sync session.
+    """
+    if failures > HTTP_MAX_RETRIES:
+        raise error
+    print(f"Connection to {target} failed ({type(error).__name__}). Retrying (attempt {failures})...")
+    await asyncio.sleep(backoff_delay(failures))
+
+def transport_stats():
+    """
+    Connections opened and reused so far by both sessions and the Notion clients, and the DNS cache
+    hits of the async session. The counters only grow (see RunMetrics.count_since for the per-run values).
+    """
+    stats = dict(async_counters)
+    stats["connections_opened"] += notion_counters["connections"]
+    stats["connections_reused"] += max(0, notion_counters["requests"] - notion_counters["connections"])
+    if session is not None:
+        for adapter in set(session.adapters.values()):  # The same adapter serves http and https
+            pools = adapter.poolmanager.pools
+            for key in pools.keys():
+                pool = pools.get(key)
+                if pool is None:
+                    continue
+                stats["connections_opened"] += pool.num_connections
+                stats["connections_reused"] += max(0, pool.num_requests - pool.num_connections)
+    return stats
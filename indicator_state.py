@@ -0,0 +1,210 @@
+import json
+import math
+import os
+import numpy as np
+import pandas as pd
+from indicators import label_indicators
+
+# Indicator state persisted between runs, one entry per timeframe and symbol
+STATE_PATH = os.getenv("INDICATOR_STATE_PATH", "indicator_state.json")
+
+# "incremental" updates the persisted state, "full" recomputes indicators over the whole history
+INDICATOR_MODE = os.getenv("INDICATOR_MODE", "incremental")
+
+# Bump when the layout or the meaning of the state changes, to force a full recompute
+STATE_VERSION = 1
+
+# Number of closes kept in the state: enough for MA50, MA10 and RSI14
+WINDOW = 50
+
+# Smoothing factors of the EMA12, EMA26 and signal (EMA9) lines, as in ewm(span=n, adjust=False)
+ALPHA_12 = 2 / 13
+ALPHA_26 = 2 / 27
+ALPHA_9 = 2 / 10
+
+# State last loaded or saved by this process, per path, with the file modification time it matches.
+# A resident process (daemon.py) reuses it instead of parsing the file again on every run.
+_loaded = {}
+
+def _modified(path):
+    """
+    Return the modification time of the state file in nanoseconds, or None if it is missing.
+    """
+    try:
+        return os.stat(path).st_mtime_ns
+    except OSError:
+        return None
+
+def load_state(path=STATE_PATH):
+    """
+    Load the persisted indicator state.
+    - The state kept in memory is returned while the file is unchanged since it was loaded or saved.
+    Returns an empty state if the file is missing, unreadable or from another version.
+    """
+    modified = _modified(path)
+    if modified is not None and path in _loaded and _loaded[path][0] == modified:
+        return _loaded[path][1]
+
+    try:
+        with open(path) as f:
+            data = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    if data.get("version") != STATE_VERSION:
+        return {}
+    states = data.get("states", {})
+    _loaded[path] = (modified, states)
+    return states
+
+def save_state(states, path=STATE_PATH):
+    """
+    Persist the indicator state, replacing the previous file atomically.
+    """
+    try:
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump({"version": STATE_VERSION, "states": states}, f)
+        os.replace(tmp_path, path)
+        _loaded[path] = (_modified(path), states)
+    except OSError as e:
+        print(f"Error saving indicator state: {e}")
+
+def full_state(times, closes):
+    """
+    Build the state of a symbol from its whole history of closed candles.
+    Missing (NaN) closes are skipped, as step_state does.
+    """
+    series = pd.Series(closes, dtype=float).dropna()
+    if series.empty:
+        return {"last_time": int(times[-1]), "count": 0, "ema12": 0.0, "ema26": 0.0, "signal": 0.0, "closes": []}
+    ema_12 = series.ewm(span=12, adjust=False).mean()
+    ema_26 = series.ewm(span=26, adjust=False).mean()
+    signal = (ema_12 - ema_26).ewm(span=9, adjust=False).mean()
+    return {
+        "last_time": int(times[-1]),
+        "count": len(series),
+        "ema12": float(ema_12.iloc[-1]),
+        "ema26": float(ema_26.iloc[-1]),
+        "signal": float(signal.iloc[-1]),
+        "closes": [float(close) for close in series.iloc[-WINDOW:]],
+    }
+
+def step_state(state, time, close):
+    """
+    Update the state with one new closed candle in O(1).
+    A missing (NaN) close only moves last_time: letting it into the EMAs would make them NaN for good.
+    """
+    state["last_time"] = int(time)
+    if math.isnan(close):
+        return
+
+    if state["count"] == 0:
+        # First candle: the EMAs start at the close and the MACD at 0
+        state["ema12"] = state["ema26"] = close
+        state["signal"] = 0.0
+    else:
+        state["ema12"] += ALPHA_12 * (close - state["ema12"])
+        state["ema26"] += ALPHA_26 * (close - state["ema26"])
+        state["signal"] += ALPHA_9 * ((state["ema12"] - state["ema26"]) - state["signal"])
+
+    state["closes"].append(close)
+    del state["closes"][:-WINDOW]
+    state["count"] += 1
+
+def state_values(state):
+    """
+    Compute the MA10/MA50, RSI14, MACD and signal values described by a state.
+    Values that need more candles than available are NaN, as with the rolling computations.
+    """
+    closes = state["closes"]
+    count = state["count"]
+
+    short_ma = sum(closes[-10:]) / 10 if count >= 10 else math.nan
+    long_ma = sum(closes[-50:]) / 50 if count >= 50 else math.nan
+
+    # The first delta of a series counts as 0, as in analyze_momentum
+    window = closes[-15:]
+    deltas = [b - a for a, b in zip(window, window[1:])]
+    if count <= 15:
+        deltas.insert(0, 0.0)
+    rsi = math.nan
+    if len(deltas) >= 14:
+        gain = sum(max(delta, 0.0) for delta in deltas[-14:]) / 14
+        loss = sum(max(-delta, 0.0) for delta in deltas[-14:]) / 14
+        if loss > 0:
+            rsi = 100 - (100 / (1 + gain / loss))
+        elif gain > 0:
+            rsi = 100.0
+
+    return {
+        "MA10": short_ma,
+        "MA50": long_ma,
+        "RSI": rsi,
+        "MACD Line": state["ema12"] - state["ema26"],
+        "Signal Line": state["signal"],
+    }
+
+def update_indicators(ohlc_df, timeframe, states):
+    """
+    Compute the indicator table of a timeframe from the persisted state.
+    - ohlc_df: DataFrame with "timestamp", "symbol" and "close" columns, in time order within each symbol.
+    - The last row of each symbol may still change (live candle or partial bucket):
+      it is applied to a copy of the state and never persisted.
+    - Rows after the last persisted candle update the state in O(1) each; the state is rebuilt
+      from the whole history when it is missing or its last candle is no longer in the data.
+    Returns a DataFrame indexed by symbol, with the same columns as compute_indicators.
+    """
+    values = {}
+    rebuilt = 0
+
+    for symbol, group in ohlc_df.groupby("symbol", sort=False, observed=True):
+        times = group["timestamp"].to_numpy().astype("datetime64[ms]").astype(np.int64)
+        closes = group["close"].to_numpy(dtype=float)
+        closed_times, closed_closes = times[:-1], closes[:-1]
+        key = f"{timeframe}:{symbol}"
+        state = states.get(key)
+
+        # Locate the last persisted candle in the closed candles
+        start = None
+        if state is not None and state["last_time"] is not None:
+            position = int(np.searchsorted(closed_times, state["last_time"]))
+            if position < len(closed_times) and closed_times[position] == state["last_time"]:
+                start = position + 1
+
+        if start is None:
+            # Missing or invalidated state: rebuild it from the whole history
+            rebuilt += 1
+            if len(closed_closes):
+                state = full_state(closed_times, closed_closes)
+            else:
+                state = {"last_time": None, "count": 0, "ema12": 0.0, "ema26": 0.0, "signal": 0.0, "closes": []}
+        else:
+            for time, close in zip(closed_times[start:], closed_closes[start:]):
+                step_state(state, time, float(close))
+        states[key] = state
+
+        # Apply the last (possibly still open) candle to a copy of the state
+        provisional = dict(state, closes=list(state["closes"]))
+        step_state(provisional, times[-1], float(closes[-1]))
+        values[symbol] = state_values(provisional)
+
+    if rebuilt:
+        print(f"Indicator state rebuilt for {rebuilt} {timeframe} series.")
+
+    table = pd.DataFrame.from_dict(values, orient="index",
+                                   columns=["MA10", "MA50", "RSI", "MACD Line", "Signal Line"])
+    return label_indicators(table)
+
+def update_indicator_tables(hourly_df, daily_df, weekly_df, path=STATE_PATH):
+    """
+    Incremental counterpart of build_indicator_tables: load the state, update every
+    timeframe from the new candles only, then persist the state.
+    """
+    states = load_state(path)
+    tables = {
+        "short": update_indicators(hourly_df, "short", states),
+        "medium": update_indicators(daily_df, "medium", states),
+        "long": update_indicators(weekly_df, "long", states),
+    }
+    save_state(states, path)
+    return tables
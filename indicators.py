@@ -0,0 +1,112 @@
+import os
+import numpy as np
+import pandas as pd
+
+# Notion property prefix of each timeframe
+TIMEFRAMES = {
+    "short": "Short Term",
+    "medium": "Medium Term",
+    "long": "Long Term",
+}
+
+# Symbols processed together by compute_indicators; bounds the temporary grouped EMA arrays
+INDICATOR_CHUNK_SYMBOLS = int(os.getenv("INDICATOR_CHUNK_SYMBOLS", "100"))
+
+def _last_window_mean(values, symbol, window):
+    """
+    Mean of the last `window` values of each symbol, NaN when a symbol has fewer values
+    (same result as the last value of `rolling(window).mean()`).
+    """
+    tail = values.groupby(symbol, sort=False, observed=True).tail(window)
+    grouped = tail.groupby(symbol.loc[tail.index], sort=False, observed=True)
+    return grouped.mean().where(grouped.count() == window)
+
+def compute_indicators(ohlc_df, chunk_symbols=INDICATOR_CHUNK_SYMBOLS):
+    """
+    Compute the trend and momentum indicators of every symbol in one grouped pass.
+    - ohlc_df: DataFrame with "symbol" and "close" columns, rows in time order within each symbol.
+    - Symbols are processed `chunk_symbols` at a time, so the temporaries of the grouped
+      EMAs cover one chunk instead of the whole history of every symbol.
+    Returns a DataFrame indexed by symbol with the MA10/MA50, RSI14, MACD and signal values,
+    plus the "trend" and "overview" labels produced by analyze_trend and analyze_momentum.
+    """
+    symbols = ohlc_df["symbol"].unique()
+    if len(symbols) > chunk_symbols:
+        return pd.concat([
+            compute_indicators(ohlc_df[ohlc_df["symbol"].isin(symbols[i:i + chunk_symbols])], chunk_symbols)
+            for i in range(0, len(symbols), chunk_symbols)
+        ])
+
+    close = ohlc_df["close"].reset_index(drop=True)
+    symbol = ohlc_df["symbol"].reset_index(drop=True)
+    grouped = close.groupby(symbol, sort=False, observed=True)
+
+    # Moving averages (10-period and 50-period) from the last rows of each symbol
+    short_ma = _last_window_mean(close, symbol, 10)
+    long_ma = _last_window_mean(close, symbol, 50)
+
+    # RSI (14-period) from the last 15 closes, the first delta of a symbol counting as 0
+    tail = grouped.tail(15)
+    tail_symbol = symbol.loc[tail.index]
+    delta = tail.groupby(tail_symbol, sort=False, observed=True).diff()
+    gain = _last_window_mean(delta.where(delta > 0, 0), tail_symbol, 14)
+    loss = _last_window_mean(-delta.where(delta < 0, 0), tail_symbol, 14)
+    rsi = 100 - (100 / (1 + gain / loss))
+
+    # MACD from the full history, using exponential moving averages computed per symbol
+    ema_12 = grouped.ewm(span=12, adjust=False).mean()
+    ema_26 = grouped.ewm(span=26, adjust=False).mean()
+    macd = (ema_12 - ema_26).droplevel(0)
+    signal = macd.groupby(symbol, sort=False, observed=True).ewm(span=9, adjust=False).mean().droplevel(0)
+    macd_line = macd.groupby(symbol, sort=False, observed=True).last()
+    signal_line = signal.groupby(symbol, sort=False, observed=True).last()
+
+    table = pd.DataFrame({
+        "MA10": short_ma,
+        "MA50": long_ma,
+        "RSI": rsi,
+        "MACD Line": macd_line,
+        "Signal Line": signal_line,
+    })
+    return label_indicators(table)
+
+def label_indicators(table):
+    """
+    Add the "trend" and "overview" labels to a table of indicator values,
+    following the same rules as analyze_trend and analyze_momentum.
+    """
+    table["trend"] = np.select(
+        [table["MA10"] > table["MA50"], table["MA10"] < table["MA50"]], ["Bullish", "Bearish"], "Range"
+    )
+    rsi_trend = np.select([table["RSI"] > 70, table["RSI"] < 30], ["Overbought", "Oversold"], "Neutral")
+    macd_trend = np.select(
+        [table["MACD Line"] > table["Signal Line"], table["MACD Line"] < table["Signal Line"]],
+        ["Bullish", "Bearish"], "Neutral"
+    )
+    table["overview"] = [f"RSI: {r} MACD: {m}" for r, m in zip(rsi_trend, macd_trend)]
+    return table
+
+def build_indicator_tables(hourly_df, daily_df, weekly_df):
+    """
+    Compute the indicator table of each timeframe (short: hourly, medium: daily, long: weekly).
+    """
+    return {
+        "short": compute_indicators(hourly_df),
+        "medium": compute_indicators(daily_df),
+        "long": compute_indicators(weekly_df),
+    }
+
+def indicator_properties(tables, symbol):
+    """
+    Build the Notion trend and momentum properties of a symbol from the indicator tables.
+    Returns None if the symbol is missing from any timeframe (or a timeframe has no table).
+    """
+    if any(timeframe not in tables or symbol not in tables[timeframe].index for timeframe in TIMEFRAMES):
+        return None
+
+    properties = {}
+    for timeframe, prefix in TIMEFRAMES.items():
+        row = tables[timeframe].loc[symbol]
+        properties[f"{prefix} Trend"] = {"select": {"name": row["trend"]}}
+        properties[f"{prefix} Momentum"] = {"select": {"name": row["overview"]}}
+    return properties
@@ -0,0 +1,60 @@
+import json
+import numpy as np
+from kline_store import KLINE_DTYPE
+
+# Use orjson when it is installed, it parses kline responses about twice as fast
+try:
+    import orjson
+    loads = orjson.loads
+except ImportError:
+    loads = json.loads
+
+# Errors of a body that is not a list of kline rows: invalid JSON (json and orjson decode errors are
+# ValueErrors), an error object instead of rows, or rows with missing or non-numeric columns
+DECODE_ERRORS = (ValueError, TypeError, KeyError, IndexError)
+
+# Position of each KLINE_DTYPE field in a raw Binance kline row; the other 6 columns are skipped
+KLINE_COLUMNS = {
+    "open_time": 0,
+    "open": 1,
+    "high": 2,
+    "low": 3,
+    "close": 4,
+    "volume": 5,
+}
+
+def decode_kline_rows(rows):
+    """
+    Convert raw Binance kline rows (lists of strings) into a preallocated KLINE_DTYPE array.
+    Only the open time and the OHLCV columns are read.
+    """
+    candles = np.empty(len(rows), dtype=KLINE_DTYPE)
+    for field, position in KLINE_COLUMNS.items():
+        # Filling one typed column at a time lets NumPy convert the strings in C
+        candles[field] = [row[position] for row in rows]
+    return candles
+
+def decode_klines(body):
+    """
+    Decode the raw body (bytes or str) of a /api/v3/klines response into a KLINE_DTYPE array.
+    """
+    return decode_kline_rows(loads(body))
+
+# Key of each KLINE_DTYPE field in the "k" object of a kline stream event
+STREAM_KLINE_KEYS = {
+    "open_time": "t",
+    "open": "o",
+    "high": "h",
+    "low": "l",
+    "close": "c",
+    "volume": "v",
+}
+
+def decode_stream_kline(kline):
+    """
+    Convert the "k" object of a WebSocket kline event into a one-candle KLINE_DTYPE array.
+    """
+    candle = np.empty(1, dtype=KLINE_DTYPE)
+    for field, key in STREAM_KLINE_KEYS.items():
+        candle[field] = kline[key]
+    return candle
@@ -0,0 +1,59 @@
+import os
+import time
+import numpy as np
+from kline_store import KLINE_DTYPE, interval_to_ms
+
+# Maximum number of candles returned by one /api/v3/klines call
+KLINES_LIMIT = 1000
+
+# "resample" derives daily/weekly data from a year of hourly candles,
+# "native" fetches each timeframe at its own Binance interval
+OHLC_FETCH_MODE = os.getenv("OHLC_FETCH_MODE", "resample")
+
+# Binance interval of each timeframe in native fetch mode
+NATIVE_INTERVALS = {
+    "hourly": "1h",
+    "daily": "1d",
+    "weekly": "1w",
+}
+
+# Bars fetched per timeframe in native mode: MA50 needs 50, the extra bars let the EMAs converge
+NATIVE_LOOKBACK_BARS = int(os.getenv("OHLC_NATIVE_LOOKBACK_BARS", "500"))
+
+def lookback_days(interval, bars=NATIVE_LOOKBACK_BARS):
+    """
+    Return the number of days covering `bars` candles of the given interval.
+    """
+    return -(-bars * interval_to_ms(interval) // 86_400_000)
+
+def plan_kline_windows(start_time, interval, end_time=None, limit=KLINES_LIMIT):
+    """
+    Split the period between start_time and end_time into request windows.
+    - Each window holds at most `limit` candles of the given interval.
+    - Windows never overlap, so every candle is requested exactly once.
+    Returns a list of (startTime, endTime) tuples in milliseconds, oldest first.
+    """
+    if end_time is None:
+        end_time = int(time.time() * 1000)
+
+    # Any span of `limit` intervals contains at most `limit` candle open times
+    span = interval_to_ms(interval) * limit
+    start = start_time
+
+    windows = []
+    while start <= end_time:
+        window_end = min(start + span - 1, end_time)
+        windows.append((start, window_end))
+        start += span
+    return windows
+
+def merge_kline_pages(pages):
+    """
+    Merge candle arrays fetched in any order into one array sorted by open time.
+    Candles present in several pages are kept once.
+    """
+    if not pages:
+        return np.empty(0, dtype=KLINE_DTYPE)
+    candles = np.concatenate(pages)
+    _, first = np.unique(candles["open_time"], return_index=True)
+    return candles[first]
@@ -0,0 +1,191 @@
+import os
+import time
+import numpy as np
+
+# Directory holding one append-only candle archive per symbol and interval
+ARCHIVE_DIR = os.getenv("OHLC_ARCHIVE_DIR", "ohlc_archive")
+
+# Fixed-width record stored in the archive files (48 bytes per candle)
+KLINE_DTYPE = np.dtype([
+    ("open_time", "<i8"),
+    ("open", "<f8"),
+    ("high", "<f8"),
+    ("low", "<f8"),
+    ("close", "<f8"),
+    ("volume", "<f8"),
+])
+
+# Duration of each supported Binance interval in milliseconds
+INTERVAL_MS = {
+    "1m": 60_000,
+    "3m": 3 * 60_000,
+    "5m": 5 * 60_000,
+    "15m": 15 * 60_000,
+    "30m": 30 * 60_000,
+    "1h": 3_600_000,
+    "2h": 2 * 3_600_000,
+    "4h": 4 * 3_600_000,
+    "6h": 6 * 3_600_000,
+    "8h": 8 * 3_600_000,
+    "12h": 12 * 3_600_000,
+    "1d": 86_400_000,
+    "3d": 3 * 86_400_000,
+    "1w": 7 * 86_400_000,
+}
+
+# Number of out-of-window candles tolerated before the archive file is rewritten
+COMPACT_THRESHOLD = 500
+
+def interval_to_ms(interval):
+    """
+    Convert a Binance interval string (e.g. "1h", "1d") into milliseconds.
+    """
+    try:
+        return INTERVAL_MS[interval]
+    except KeyError:
+        raise ValueError(f"Unsupported Binance interval: {interval}")
+
+def archive_path(symbol, interval, archive_dir=ARCHIVE_DIR):
+    """
+    Return the path of the archive file for the given symbol and interval.
+    """
+    return os.path.join(archive_dir, f"{symbol}_{interval}.bin")
+
+def first_open_path(symbol, interval, archive_dir=ARCHIVE_DIR):
+    """
+    Return the path of the file holding the first open time Binance has for the symbol and interval.
+    """
+    return os.path.join(archive_dir, f"{symbol}_{interval}.first")
+
+def load_first_open(symbol, interval, archive_dir=ARCHIVE_DIR):
+    """
+    Return the first open time available on Binance for the symbol (its listing),
+    or None when it was never observed.
+    """
+    try:
+        with open(first_open_path(symbol, interval, archive_dir)) as f:
+            return int(f.read().strip())
+    except (OSError, ValueError):
+        return None
+
+def store_first_open(symbol, interval, first_open, archive_dir=ARCHIVE_DIR):
+    """
+    Record the first open time available on Binance for the symbol.
+    """
+    os.makedirs(archive_dir, exist_ok=True)
+    with open(first_open_path(symbol, interval, archive_dir), "w") as f:
+        f.write(str(first_open))
+
+def load_candles(symbol, interval, archive_dir=ARCHIVE_DIR):
+    """
+    Memory-map the stored candles for a symbol.
+    Returns an empty array if no archive exists yet.
+    """
+    path = archive_path(symbol, interval, archive_dir)
+    if not os.path.exists(path):
+        return np.empty(0, dtype=KLINE_DTYPE)
+
+    # Ignore a partially written trailing record (e.g. after an interrupted run)
+    count = os.path.getsize(path) // KLINE_DTYPE.itemsize
+    if count == 0:
+        return np.empty(0, dtype=KLINE_DTYPE)
+    return np.memmap(path, dtype=KLINE_DTYPE, mode="r", shape=(count,))
+
+def window_start_ms(days, now_ms=None):
+    """
+    Return the open time (in milliseconds) of the oldest candle in the requested window.
+    """
+    if now_ms is None:
+        now_ms = int(time.time() * 1000)
+    return now_ms - days * 86_400_000
+
+def next_start_time(stored, interval, window_start, first_available=None):
+    """
+    Determine the first open time that must be requested from Binance.
+    - Resume right after the last stored candle when the archive covers the window.
+      An archive starting at the symbol's first available candle (first_available, see
+      load_first_open) covers it too, even when the symbol is younger than the window.
+    - Fall back to the start of the window when the archive is missing, stale or too short.
+    """
+    if len(stored) == 0:
+        return window_start
+
+    first_open = int(stored["open_time"][0])
+    last_open = int(stored["open_time"][-1])
+    interval_ms = interval_to_ms(interval)
+
+    # The archive does not reach back far enough (nor to the listing) or is older than the window
+    starts_at_listing = first_available is not None and first_open <= first_available
+    if (first_open > window_start + interval_ms and not starts_at_listing) or last_open < window_start:
+        return window_start
+    return last_open + interval_ms
+
+def merge_and_persist(symbol, interval, stored, candles, window_start, archive_dir=ARCHIVE_DIR, now_ms=None):
+    """
+    Merge freshly fetched candles into the archive and return the candles in the window.
+    - candles: KLINE_DTYPE array sorted by open time, as produced by the kline parser.
+    - Only closed candles are appended to the archive; the live candle is returned but not stored.
+    - The archive is rewritten when it does not cover the window or holds too many old candles.
+    """
+    if now_ms is None:
+        now_ms = int(time.time() * 1000)
+
+    # A candle is closed once its whole interval has elapsed
+    closed = candles["open_time"] + interval_to_ms(interval) <= now_ms
+    new_closed = candles[closed]
+    live = candles[~closed]
+
+    path = archive_path(symbol, interval, archive_dir)
+    os.makedirs(archive_dir, exist_ok=True)
+
+    first_available = load_first_open(symbol, interval, archive_dir)
+    resume = len(stored) > 0 and next_start_time(stored, interval, window_start, first_available) != window_start
+    if not resume and len(candles) and int(candles["open_time"][0]) > window_start + interval_to_ms(interval):
+        # Fetched from the start of the window, Binance began later: the symbol is younger than the window
+        store_first_open(symbol, interval, int(candles["open_time"][0]), archive_dir)
+    if resume:
+        # Only keep candles that are strictly newer than the last stored one
+        new_closed = new_closed[new_closed["open_time"] > stored["open_time"][-1]]
+        archived = np.concatenate([stored, new_closed])
+    else:
+        archived = new_closed
+
+    # Trim the archive to the requested window
+    stale = int(np.count_nonzero(archived["open_time"] < window_start))
+    archived = archived[archived["open_time"] >= window_start]
+
+    if not resume or stale >= COMPACT_THRESHOLD:
+        # Rewrite the archive atomically with the candles of the window
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(archived.tobytes())
+        os.replace(tmp_path, path)
+    elif len(new_closed):
+        # Append the new closed candles to the existing archive
+        with open(path, "ab") as f:
+            f.write(new_closed.tobytes())
+
+    return np.concatenate([archived, live])
+
+def append_candles(symbol, interval, stored, candles, window_start, archive_dir=ARCHIVE_DIR):
+    """
+    Append closed candles that directly follow the archive (e.g. from a kline stream)
+    and return the archived candles in the window.
+    - stored: the current archive, as returned by load_candles.
+    - The archive is rewritten once it holds COMPACT_THRESHOLD candles older than the window.
+    """
+    archived = np.concatenate([stored, candles])
+    stale = int(np.searchsorted(archived["open_time"], window_start))
+
+    path = archive_path(symbol, interval, archive_dir)
+    os.makedirs(archive_dir, exist_ok=True)
+    if stale >= COMPACT_THRESHOLD:
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(archived[stale:].tobytes())
+        os.replace(tmp_path, path)
+    else:
+        with open(path, "ab") as f:
+            f.write(candles.tobytes())
+
+    return archived[stale:]
@@ -0,0 +1,361 @@
+"""
+Streaming mode: keep the candles current from Binance kline WebSocket streams instead of polling REST.
+
+- The watchlist is read from Notion and each symbol is backfilled once through REST (incrementally,
+  from the local archive), then analyzed and pushed to Notion.
+- Combined streams (<symbol>@kline_<interval>) are subscribed, KLINE_STREAMS_PER_CONNECTION per
+  connection. In-progress updates are ignored; each closed candle is appended to the in-memory
+  series and to the archive.
+- Indicators and Notion updates are only recomputed when a candle closes. The closes arriving within
+  KLINE_STREAM_CLOSE_GRACE seconds (every symbol closes at the same time) are processed as one batch.
+- A missed candle (e.g. during a reconnect) is backfilled through REST before the next recomputation.
+- The watchlist is re-read every KLINE_STREAM_REFRESH seconds; the streams follow its changes.
+
+    python kline_stream.py                                         # live Binance streams
+    BINANCE_STREAM_URL=ws://127.0.0.1:8765 python kline_stream.py  # replay from fake_services.py
+    python kline_stream.py --record klines.jsonl --seconds 3600    # record the messages for fake_services.py
+"""
+import argparse
+import asyncio
+import os
+import signal
+import time
+import aiohttp
+import app_async
+from http_transport import close_async_session, get_async_session, transport_stats
+from analysis_pool import analyze_candles, index_states
+from indicator_state import INDICATOR_MODE, load_state, save_state
+from kline_parser import decode_stream_kline, loads
+from kline_planner import NATIVE_INTERVALS, OHLC_FETCH_MODE, lookback_days
+from kline_store import ARCHIVE_DIR, append_candles, interval_to_ms, load_candles, window_start_ms
+from rollups import OHLC_ROLLUP_MODE
+
+# Base URL of the Binance market streams, overridable to replay klines from fake_services.py
+BINANCE_STREAM_URL = os.getenv("BINANCE_STREAM_URL", "wss://stream.binance.com:9443")
+
+# Streams per WebSocket connection (Binance accepts up to 1024)
+STREAMS_PER_CONNECTION = int(os.getenv("KLINE_STREAMS_PER_CONNECTION", "200"))
+
+# Seconds to wait after a close for the other closes of the same moment before recomputing
+STREAM_CLOSE_GRACE = float(os.getenv("KLINE_STREAM_CLOSE_GRACE", "2"))
+
+# Seconds between two reads of the Notion watchlist
+STREAM_REFRESH = float(os.getenv("KLINE_STREAM_REFRESH", "900"))
+
+# Upper bound of the exponential reconnection delay, in seconds
+STREAM_RECONNECT_MAX_DELAY = float(os.getenv("KLINE_STREAM_RECONNECT_MAX_DELAY", "60"))
+
+run_metrics = app_async.run_metrics
+
+def stream_timeframes(fetch_mode=OHLC_FETCH_MODE):
+    """
+    Binance interval streamed for each analyzed timeframe: the three native intervals,
+    or only the hourly candles, which are then rolled up into daily and weekly bars.
+    """
+    return dict(NATIVE_INTERVALS) if fetch_mode == "native" else {"hourly": "1h"}
+
+def history_days(interval, fetch_mode=OHLC_FETCH_MODE):
+    """
+    Days of candles kept for an interval, as in the REST runs.
+    """
+    return lookback_days(interval) if fetch_mode == "native" else 365
+
+def stream_names(symbols, intervals):
+    """
+    Return the combined-stream names (e.g. "btcusdt@kline_1h") of every symbol and interval.
+    """
+    return [f"{symbol.lower()}@kline_{interval}" for symbol in symbols for interval in intervals]
+
+def chunk_streams(names, size=STREAMS_PER_CONNECTION):
+    """
+    Split the stream names into groups of at most `size`, one per connection.
+    """
+    return [names[i:i + size] for i in range(0, len(names), size)]
+
+def closed_candles(candles, interval, now_ms):
+    """
+    Keep the candles whose whole interval has elapsed.
+    """
+    if len(candles) == 0:
+        return candles
+    return candles[candles["open_time"] + interval_to_ms(interval) <= now_ms]
+
+async def read_watchlist():
+    """
+    Read the Notion table and group the entries by watchlisted Binance symbol.
+    Returns None when the table cannot be read, so the current subscription is kept.
+    """
+    full_table = await app_async.get_full_table(app_async.database_id)
+    if not full_table:
+        return None
+
+    symbols = {entry["binance_id"] for entry in app_async.filter_for_binance(full_table)}
+    entries_by_symbol = {symbol: [] for symbol in sorted(symbols)}
+    for entry in full_table:
+        _, binance_id = app_async.entry_api_ids(entry)
+        if binance_id in entries_by_symbol:
+            entries_by_symbol[binance_id].append(entry)
+    return entries_by_symbol
+
+async def backfill_symbol(stream, symbol):
+    """
+    Load the closed candles of a symbol through REST, for every streamed timeframe.
+    Only the candles missing from the local archive are requested.
+    """
+    data = await app_async.fetch_symbol_candles(stream["session"], symbol)
+    now_ms = int(time.time() * 1000)
+    stream["series"][symbol] = {
+        timeframe: closed_candles(candles, stream["timeframes"][timeframe], now_ms)
+        for timeframe, candles in data.items()
+    }
+
+async def refresh_symbol(stream, symbol):
+    """
+    Recompute the indicators of one symbol from its in-memory series and push its Notion updates.
+    Timeframes that missed a candle are backfilled through REST first.
+    """
+    try:
+        gaps = [timeframe for gap_symbol, timeframe in stream["gaps"] if gap_symbol == symbol]
+        if gaps:
+            await backfill_symbol(stream, symbol)
+            for timeframe in gaps:
+                stream["gaps"].discard((symbol, timeframe))
+
+        series = stream["series"].get(symbol)
+        if not series or not all(len(candles) for candles in series.values()):
+            print(f"No OHLC data available for {symbol}. Skipping...")
+            return
+
+        shard = {timeframe: {symbol: candles} for timeframe, candles in series.items()}
+        # Symbols of a batch are analyzed concurrently: one sample per symbol
+        with run_metrics.sample("analysis"):
+            _, indicator_tables, states = await asyncio.get_running_loop().run_in_executor(
+                None, analyze_candles, shard, OHLC_ROLLUP_MODE, INDICATOR_MODE,
+                stream["symbol_states"].get(symbol, {}), ARCHIVE_DIR
+            )
+        stream["states"].update(states)
+        stream["symbol_states"][symbol] = states
+
+        for entry in stream["entries"].get(symbol, []):
+            updated_properties = app_async.build_entry_update(entry, {}, indicator_tables)
+            if updated_properties and await app_async.update_security_entry(entry["id"], updated_properties):
+                # Later diffs compare against the values just written
+                entry["properties"].update(updated_properties)
+
+    except Exception as e:
+        # One failing symbol must not stop the stream
+        print(f"Error refreshing {symbol}: {e}")
+
+async def refresh_symbols(stream, symbols):
+    """
+    Refresh a batch of symbols concurrently, then persist the indicator state once.
+    """
+    with run_metrics.stage("notion_writes", app_async.notion_limiter):
+        await asyncio.gather(*(refresh_symbol(stream, symbol) for symbol in symbols))
+    if INDICATOR_MODE == "incremental":
+        save_state(stream["states"])
+
+async def flush_closes(stream):
+    """
+    Process the symbols whose candles closed, in batches of the closes arriving within the grace delay.
+    """
+    while stream["pending"]:
+        await asyncio.sleep(STREAM_CLOSE_GRACE)
+        symbols = sorted(stream["pending"])
+        stream["pending"].clear()
+        print(f"Candles closed for {len(symbols)} symbols. Refreshing...")
+        await refresh_symbols(stream, symbols)
+
+def handle_message(stream, message):
+    """
+    Apply one combined-stream message: closed candles are stored and schedule a refresh of their symbol.
+    """
+    data = message.get("data", message)
+    if data.get("e") != "kline":
+        return
+    run_metrics.count("stream", "messages")
+
+    kline = data["k"]
+    if not kline["x"]:
+        return  # In-progress update, wait for the close
+
+    symbol = kline["s"]
+    interval = kline["i"]
+    timeframe = stream["intervals"].get(interval)
+    series = stream["series"].get(symbol)
+    if timeframe is None or series is None:
+        return
+
+    candle = decode_stream_kline(kline)
+    open_time = int(candle["open_time"][0])
+    candles = series.get(timeframe, [])
+    if len(candles) and open_time <= candles["open_time"][-1]:
+        return  # Already stored, e.g. replayed after a reconnect
+    run_metrics.count("stream", "closed_candles")
+
+    stored = load_candles(symbol, interval, ARCHIVE_DIR)
+    contiguous = len(candles) and open_time == candles["open_time"][-1] + interval_to_ms(interval)
+    in_sync = contiguous and len(stored) and stored["open_time"][-1] == candles["open_time"][-1]
+    if not (contiguous and in_sync):
+        # Candles were missed, or the archive no longer matches the series: backfill through REST before the refresh
+        stream["gaps"].add((symbol, timeframe))
+    else:
+        close_ms = int(kline["T"]) + 1
+        series[timeframe] = append_candles(symbol, interval, stored, candle,
+                                           window_start_ms(history_days(interval), close_ms), ARCHIVE_DIR)
+
+    stream["pending"].add(symbol)
+    if stream["flush"] is None or stream["flush"].done():
+        stream["flush"] = asyncio.create_task(flush_closes(stream))
+
+async def consume(stream, names):
+    """
+    Subscribe to a group of streams and apply their messages, reconnecting with exponential backoff.
+    """
+    url = f"{BINANCE_STREAM_URL}/stream?streams={'/'.join(names)}"
+    delay = 1.0
+    while True:
+        try:
+            async with stream["session"].ws_connect(url, heartbeat=60) as ws:
+                print(f"Subscribed to {len(names)} kline streams.")
+                delay = 1.0
+                async for msg in ws:
+                    if msg.type == aiohttp.WSMsgType.TEXT:
+                        handle_message(stream, loads(msg.data))
+                    elif msg.type == aiohttp.WSMsgType.ERROR:
+                        break
+            print("Kline stream closed. Reconnecting...")
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            print(f"Kline stream error: {e}. Reconnecting in {delay:.0f}s...")
+
+        run_metrics.count("stream", "reconnects")
+        await asyncio.sleep(delay)
+        delay = min(delay * 2, STREAM_RECONNECT_MAX_DELAY)
+
+async def resubscribe(stream, entries_by_symbol, connections):
+    """
+    Follow a watchlist change: backfill and refresh the new symbols, then replace the connections.
+    """
+    for task in connections:
+        task.cancel()
+    await asyncio.gather(*connections, return_exceptions=True)
+
+    new_symbols = [symbol for symbol in entries_by_symbol if symbol not in stream["series"]]
+    stream["entries"] = entries_by_symbol
+    stream["series"] = {symbol: series for symbol, series in stream["series"].items() if symbol in entries_by_symbol}
+
+    if new_symbols:
+        print(f"Backfilling {len(new_symbols)} symbols through REST...")
+        with run_metrics.stage("binance", app_async.binance_limiter):
+            await asyncio.gather(*(backfill_symbol(stream, symbol) for symbol in new_symbols))
+        await refresh_symbols(stream, new_symbols)
+
+    names = stream_names(list(entries_by_symbol), stream["intervals"])
+    return [asyncio.create_task(consume(stream, group)) for group in chunk_streams(names)]
+
+async def run_stream(refresh=STREAM_REFRESH):
+    """
+    Stream the klines of the watchlist until SIGINT/SIGTERM.
+    """
+    run_metrics.reset()
+    transport_before = transport_stats()
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        try:
+            loop.add_signal_handler(sig, stop.set)
+        except NotImplementedError:
+            pass  # Signal handlers are not available on Windows event loops
+
+    timeframes = stream_timeframes()
+    states = load_state() if INDICATOR_MODE == "incremental" else {}
+    stream = {
+        "timeframes": timeframes,  # Interval of each timeframe
+        "intervals": {interval: timeframe for timeframe, interval in timeframes.items()},
+        "entries": {},  # Notion entries of each symbol
+        "series": {},  # Closed candles of each symbol and timeframe
+        "states": states,
+        "symbol_states": index_states(states),  # The same states, indexed by symbol
+        "gaps": set(),  # (symbol, timeframe) pairs to backfill through REST
+        "pending": set(),  # Symbols with a closed candle waiting for their refresh
+        "flush": None,
+        "session": None,
+    }
+    connections = []
+
+    # The WebSocket connections and the REST backfills share the pooled transport session
+    stream["session"] = get_async_session()
+    try:
+        while not stop.is_set():
+            with run_metrics.stage("notion_read"):
+                entries_by_symbol = await read_watchlist()
+            if entries_by_symbol is None:
+                print("Could not read the watchlist. Keeping the current streams.")
+            elif set(entries_by_symbol) != set(stream["entries"]) or not connections:
+                connections = await resubscribe(stream, entries_by_symbol, connections)
+            else:
+                # Same symbols: only take the fresh Notion properties for the next diffs
+                stream["entries"] = entries_by_symbol
+
+            try:
+                await asyncio.wait_for(stop.wait(), timeout=refresh)
+            except asyncio.TimeoutError:
+                pass
+    finally:
+        # Stop the connections and any refresh in progress before the session closes
+        tasks = connections + ([stream["flush"]] if stream["flush"] else [])
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        if INDICATOR_MODE == "incremental" and stream["states"]:
+            save_state(stream["states"])
+        run_metrics.count_since("http", transport_before, transport_stats())
+        run_metrics.write()
+        await close_async_session()
+        print("Kline stream stopped.")
+
+async def record(path, seconds):
+    """
+    Write the raw combined-stream messages of the watchlist to a JSON-lines file for `seconds`,
+    to be replayed by fake_services.py.
+    """
+    entries_by_symbol = await read_watchlist() or {}
+    names = stream_names(list(entries_by_symbol), stream_timeframes().values())
+    deadline = time.monotonic() + seconds
+    count = 0
+
+    async def record_group(session, group, f):
+        nonlocal count
+        url = f"{BINANCE_STREAM_URL}/stream?streams={'/'.join(group)}"
+        async with session.ws_connect(url, heartbeat=60) as ws:
+            while (remaining := deadline - time.monotonic()) > 0:
+                try:
+                    msg = await ws.receive(timeout=remaining)
+                except asyncio.TimeoutError:
+                    break
+                if msg.type != aiohttp.WSMsgType.TEXT:
+                    break
+                f.write(msg.data + "\n")
+                count += 1
+
+    with open(path, "w") as f:
+        try:
+            session = get_async_session()
+            await asyncio.gather(*(record_group(session, group, f) for group in chunk_streams(names)))
+        finally:
+            await close_async_session()
+    print(f"Recorded {count} messages from {len(names)} streams to {path}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Stream Binance klines into the Notion portfolio.")
+    parser.add_argument("--record", metavar="PATH", help="record the raw stream messages instead of processing them")
+    parser.add_argument("--seconds", type=float, default=3600, help="recording duration")
+    args = parser.parse_args()
+
+    if args.record:
+        asyncio.run(record(args.record, args.seconds))
+    else:
+        asyncio.run(run_stream())
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+import json
+import os
+import time
+
+# CoinGecko returns at most 250 coins per /coins/markets page
+COINGECKO_PAGE_SIZE = 250
+
+# Keep the ids parameter of each request well below common URL length limits
+MAX_IDS_LENGTH = 4000
+
+# On-disk cache of /coins/markets items and how long they can be reused
+MARKET_CACHE_PATH = os.getenv("COINGECKO_CACHE_PATH", "coingecko_cache.json")
+MARKET_CACHE_TTL = float(os.getenv("COINGECKO_CACHE_TTL", "60"))
+
+def chunk_ids(ids, size=COINGECKO_PAGE_SIZE, max_length=MAX_IDS_LENGTH):
+    """
+    Split a list of CoinGecko ids into chunks accepted by /coins/markets.
+    Each chunk holds at most `size` ids and at most `max_length` characters once joined.
+    """
+    chunks = []
+    current = []
+    length = 0
+    for coin_id in dict.fromkeys(ids):  # Drop duplicates while keeping the order
+        if current and (len(current) == size or length + len(coin_id) + 1 > max_length):
+            chunks.append(current)
+            current = []
+            length = 0
+        current.append(coin_id)
+        length += len(coin_id) + 1
+    if current:
+        chunks.append(current)
+    return chunks
+
+def market_params(ids, vs_currency="usd"):
+    """
+    Build the /coins/markets query parameters for one chunk of ids.
+    """
+    return {
+        "vs_currency": vs_currency,
+        "ids": ",".join(ids),
+        "order": "market_cap_desc",
+        "per_page": len(ids),
+        "page": 1,
+        "price_change_percentage": "7d,30d"
+    }
+
+def split_chunk_results(chunks, results):
+    """
+    Pair each chunk of ids with its result, a page of market items or the exception it raised.
+    Returns the fetched items, the ids of the failed chunks and the distinct errors.
+    """
+    items = []
+    failed_ids = []
+    errors = []
+    for ids, result in zip(chunks, results):
+        if isinstance(result, BaseException):
+            failed_ids.extend(ids)
+            if repr(result) not in errors:
+                errors.append(repr(result))
+        else:
+            items.extend(result)
+    return items, failed_ids, errors
+
+def _read_cache(path):
+    """
+    Read the cache file, returning an empty cache if it is missing or unreadable.
+    """
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+def load_cached_markets(ids, vs_currency="usd", ttl=MARKET_CACHE_TTL, path=MARKET_CACHE_PATH):
+    """
+    Look up market items fetched less than `ttl` seconds ago.
+    Returns the cached items and the list of ids that still have to be fetched.
+    """
+    cache = _read_cache(path)
+    now = time.time()
+    items = []
+    missing_ids = []
+    for coin_id in dict.fromkeys(ids):
+        entry = cache.get(f"{vs_currency}:{coin_id}")
+        if entry and now - entry["fetched_at"] < ttl:
+            items.append(entry["item"])
+        else:
+            missing_ids.append(coin_id)
+    return items, missing_ids
+
+def store_cached_markets(items, vs_currency="usd", ttl=MARKET_CACHE_TTL, path=MARKET_CACHE_PATH):
+    """
+    Add freshly fetched market items to the cache and drop expired entries.
+    """
+    now = time.time()
+    cache = {key: entry for key, entry in _read_cache(path).items() if now - entry["fetched_at"] < ttl}
+    for item in items:
+        cache[f"{vs_currency}:{item['id']}"] = {"fetched_at": now, "item": item}
+
+    try:
+        # Write to a temporary file first so a concurrent run never reads a partial cache
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(cache, f)
+        os.replace(tmp_path, path)
+    except OSError as e:
+        print(f"Error saving CoinGecko cache: {e}")
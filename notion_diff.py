@@ -0,0 +1,44 @@
+import math
+import os
+
+# Relative tolerance under which two numbers are considered unchanged
+NUMBER_TOLERANCE = float(os.getenv("NOTION_NUMBER_TOLERANCE", "1e-6"))
+
+def numbers_equal(current, new, rel_tol=NUMBER_TOLERANCE):
+    """
+    Compare two Notion number values, treating missing values as equal only to each other.
+    """
+    if current is None or new is None:
+        return current is None and new is None
+    return math.isclose(current, new, rel_tol=rel_tol, abs_tol=1e-12)
+
+def property_unchanged(current_property, new_property, rel_tol=NUMBER_TOLERANCE):
+    """
+    Check whether a computed property already matches the value stored in Notion.
+    Only number and select properties are compared; any other type is considered changed.
+    """
+    if current_property is None:
+        return False
+
+    if "number" in new_property:
+        return numbers_equal(current_property.get("number"), new_property["number"], rel_tol)
+
+    if "select" in new_property:
+        current_name = (current_property.get("select") or {}).get("name")
+        new_name = (new_property["select"] or {}).get("name")
+        return current_name == new_name
+
+    return False
+
+def diff_properties(page_properties, updated_properties, rel_tol=NUMBER_TOLERANCE):
+    """
+    Keep only the computed properties whose value differs from the page's current value.
+    - page_properties: the "properties" of the page as returned by the Notion query.
+    - updated_properties: the properties computed for this run.
+    Returns a dictionary with the changed properties (empty if the page is up to date).
+    """
+    return {
+        name: new_property
+        for name, new_property in updated_properties.items()
+        if not property_unchanged(page_properties.get(name), new_property, rel_tol)
+    }
@@ -0,0 +1,59 @@
+import os
+from urllib.parse import unquote
+
+# Push the watchlist filters and the property projection into the Notion query
+NOTION_PUSH_FILTERS = os.getenv("NOTION_PUSH_FILTERS", "1") == "1"
+
+# Properties read or compared by the pipeline; everything else is left out of the query results
+PIPELINE_PROPERTIES = [
+    "Symbol",
+    "Watchlist General",
+    "Watchlist OHLC",
+    "ID API Coingecko",
+    "ID API Binance",
+    "Price",
+    "Market Cap",
+    "FDV",
+    "Volume 24h",
+    "24h Change %",
+    "7d Change %",
+    "30d Change %",
+    "Short Term Trend",
+    "Medium Term Trend",
+    "Long Term Trend",
+    "Short Term Momentum",
+    "Medium Term Momentum",
+    "Long Term Momentum",
+]
+
+def watchlist_filter():
+    """
+    Build the Notion query filter equivalent to filter_for_coingecko and filter_for_binance.
+    - 'Watchlist General' is true and 'ID API Coingecko' is not empty, or
+    - 'Watchlist OHLC' is true and 'ID API Binance' is not empty.
+    """
+    return {
+        "or": [
+            {
+                "and": [
+                    {"property": "Watchlist General", "formula": {"checkbox": {"equals": True}}},
+                    {"property": "ID API Coingecko", "rich_text": {"is_not_empty": True}},
+                ]
+            },
+            {
+                "and": [
+                    {"property": "Watchlist OHLC", "formula": {"checkbox": {"equals": True}}},
+                    {"property": "ID API Binance", "rich_text": {"is_not_empty": True}},
+                ]
+            },
+        ]
+    }
+
+def projected_property_ids(database, names=PIPELINE_PROPERTIES):
+    """
+    Map the pipeline's property names to the property IDs expected by `filter_properties`.
+    Properties missing from the database are ignored.
+    IDs are returned URL-encoded by Notion and decoded here, since the client encodes query parameters itself.
+    """
+    properties = database.get("properties", {})
+    return [unquote(properties[name]["id"]) for name in names if name in properties]
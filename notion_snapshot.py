@@ -0,0 +1,124 @@
+import json
+import os
+import sqlite3
+import time
+
+# Local snapshot of the Notion database, indexed by page id
+SNAPSHOT_PATH = os.getenv("NOTION_SNAPSHOT_PATH", "notion_snapshot.sqlite")
+
+# "incremental" only downloads pages edited since the last sync, "full" pages through the whole database
+NOTION_SYNC_MODE = os.getenv("NOTION_SYNC_MODE", "incremental")
+
+# Interval between full passes, which reconcile pages deleted or archived in Notion
+FULL_SYNC_HOURS = float(os.getenv("NOTION_FULL_SYNC_HOURS", "24"))
+
+# Snapshot connections kept open for the life of the process (see get_snapshot)
+_snapshots = {}
+
+class SnapshotConnection(sqlite3.Connection):
+    """
+    SQLite connection that also keeps the decoded pages of each database it synced.
+    - pages: {database_id: (data_version, {page_id: page})}, in the snapshot's row order.
+    A long-lived connection then skips reading and decoding the whole snapshot on every sync.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.pages = {}
+
+def open_snapshot(path=SNAPSHOT_PATH):
+    """
+    Open (and create if needed) the local snapshot database.
+    """
+    # Runs of the sync entry point may come from different worker threads (daemon.py), never at once
+    conn = sqlite3.connect(path, factory=SnapshotConnection, check_same_thread=False)
+    conn.execute(
+        "CREATE TABLE IF NOT EXISTS pages ("
+        "database_id TEXT, id TEXT, last_edited_time TEXT, data TEXT, "
+        "PRIMARY KEY (database_id, id))"
+    )
+    conn.execute(
+        "CREATE TABLE IF NOT EXISTS sync_state ("
+        "database_id TEXT PRIMARY KEY, last_full_sync REAL)"
+    )
+    return conn
+
+def get_snapshot(path=SNAPSHOT_PATH):
+    """
+    Return the shared connection to the snapshot at `path`, opening it on first use.
+    A resident process (daemon.py) keeps it, and the pages it decoded, between runs.
+    """
+    conn = _snapshots.get(path)
+    if conn is None:
+        conn = _snapshots[path] = open_snapshot(path)
+    return conn
+
+def close_snapshots():
+    """
+    Close the shared snapshot connections.
+    """
+    while _snapshots:
+        _snapshots.popitem()[1].close()
+
+def incremental_filter(conn, database_id, full_sync_hours=FULL_SYNC_HOURS):
+    """
+    Build the Notion query filter for an incremental sync.
+    Returns None when a full pass is due (no snapshot yet or the last full pass is too old).
+    """
+    row = conn.execute("SELECT last_full_sync FROM sync_state WHERE database_id = ?", (database_id,)).fetchone()
+    if row is None or time.time() - row[0] > full_sync_hours * 3600:
+        return None
+
+    # last_edited_time is truncated to the minute by Notion, so pages edited during the
+    # minute of the latest known edit are fetched again rather than missed
+    latest = conn.execute(
+        "SELECT MAX(last_edited_time) FROM pages WHERE database_id = ?", (database_id,)
+    ).fetchone()[0]
+    if latest is None:
+        return None
+    return {"timestamp": "last_edited_time", "last_edited_time": {"on_or_after": latest}}
+
+def apply_sync(conn, database_id, pages, full):
+    """
+    Store the pages returned by a sync in the snapshot and return every page of the database.
+    - A full pass replaces the snapshot, dropping pages that no longer exist in Notion.
+    - An incremental pass upserts the changed pages and drops those reported as archived.
+    The pages decoded by the previous sync on this connection are reused as long as no other
+    connection wrote to the snapshot since (PRAGMA data_version is unchanged).
+    """
+    version = conn.execute("PRAGMA data_version").fetchone()[0]
+    known_version, known = conn.pages.get(database_id, (None, None))
+    if full:
+        known = {}
+    elif known_version != version:
+        known = None
+
+    with conn:
+        if full:
+            conn.execute("DELETE FROM pages WHERE database_id = ?", (database_id,))
+            conn.execute(
+                "INSERT OR REPLACE INTO sync_state (database_id, last_full_sync) VALUES (?, ?)",
+                (database_id, time.time()),
+            )
+
+        for page in pages:
+            if page.get("archived") or page.get("in_trash"):
+                conn.execute("DELETE FROM pages WHERE database_id = ? AND id = ?", (database_id, page["id"]))
+                continue
+            conn.execute(
+                "INSERT OR REPLACE INTO pages (database_id, id, last_edited_time, data) VALUES (?, ?, ?, ?)",
+                (database_id, page["id"], page.get("last_edited_time"), json.dumps(page)),
+            )
+
+    if known is None:
+        rows = conn.execute("SELECT data FROM pages WHERE database_id = ? ORDER BY rowid", (database_id,))
+        known = {page["id"]: page for page in (json.loads(data) for (data,) in rows)}
+    else:
+        # Mirror the writes above: a replaced row moves to the end of the rowid order
+        for page in pages:
+            known.pop(page["id"], None)
+            if not (page.get("archived") or page.get("in_trash")):
+                known[page["id"]] = page
+
+    conn.pages[database_id] = (version, known)
+    return list(known.values())
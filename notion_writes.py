@@ -0,0 +1,84 @@
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+def summarize_writes(results, elapsed, limiter):
+    """
+    Build and print a summary of a write queue run.
+    - results: list of (page_id, succeeded) tuples.
+    - elapsed: wall time of the run in seconds.
+    - limiter: the Notion rate limiter, used for retry and throttling counters.
+    """
+    failed_pages = [page_id for page_id, succeeded in results if not succeeded]
+    summary = {
+        "total": len(results),
+        "succeeded": len(results) - len(failed_pages),
+        "failed": len(failed_pages),
+        "failed_pages": failed_pages,
+        "retries": limiter.stats["retries"],
+        "throttled": limiter.stats["throttled"],
+        "elapsed_seconds": round(elapsed, 2),
+        "pages_per_second": round(len(results) / elapsed, 2) if elapsed > 0 else None,
+    }
+
+    print(
+        f"Notion writes: {summary['succeeded']}/{summary['total']} succeeded, "
+        f"{summary['failed']} failed, {summary['retries']} retries, {summary['throttled']} throttled, "
+        f"{summary['elapsed_seconds']}s ({summary['pages_per_second']} pages/s)"
+    )
+    if failed_pages:
+        print(f"Failed pages: {', '.join(failed_pages)}")
+    return summary
+
+def run_write_queue(update_fn, updates, limiter):
+    """
+    Send Notion page updates through a pool of worker threads.
+    - update_fn(page_id, properties) performs one paced, retrying update and returns True on success.
+    - updates: list of (page_id, properties) tuples.
+    - limiter: the shared Notion rate limiter; its in-flight cap sizes the pool.
+    Returns the summary of the run.
+    """
+    start = time.perf_counter()
+    if not updates:
+        return summarize_writes([], 0, limiter)
+
+    with ThreadPoolExecutor(max_workers=limiter.max_in_flight) as executor:
+        outcomes = list(executor.map(lambda update: update_fn(*update), updates))
+
+    results = [(page_id, succeeded) for (page_id, _), succeeded in zip(updates, outcomes)]
+    return summarize_writes(results, time.perf_counter() - start, limiter)
+
+async def send_updates_async(update_fn, updates, workers):
+    """
+    Send Notion page updates through `workers` asyncio workers pulling from one queue.
+    - update_fn(page_id, properties) is a coroutine function performing one paced,
+      retrying update and returning True on success.
+    - updates: list of (page_id, properties) tuples.
+    Returns the list of (page_id, succeeded) tuples, without printing a summary.
+    """
+    queue = asyncio.Queue()
+    for update in updates:
+        queue.put_nowait(update)
+    results = []
+
+    async def worker():
+        # Pull updates until the queue is drained
+        while not queue.empty():
+            page_id, properties = queue.get_nowait()
+            results.append((page_id, await update_fn(page_id, properties)))
+
+    await asyncio.gather(*[worker() for _ in range(min(workers, len(updates)))])
+    return results
+
+async def run_write_queue_async(update_fn, updates, limiter):
+    """
+    Send Notion page updates through a fixed number of asyncio workers.
+    - update_fn(page_id, properties) is a coroutine function performing one paced,
+      retrying update and returning True on success.
+    - updates: list of (page_id, properties) tuples.
+    - limiter: the shared Notion rate limiter; its in-flight cap sets the number of workers.
+    Returns the summary of the run.
+    """
+    start = time.perf_counter()
+    results = await send_updates_async(update_fn, updates, limiter.max_in_flight)
+    return summarize_writes(results, time.perf_counter() - start, limiter)
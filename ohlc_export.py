@@ -0,0 +1,78 @@
+import os
+import shutil
+
+# Output format of the OHLC exports: "csv", "parquet", "feather" (Arrow IPC) or "none" to skip them
+OHLC_EXPORT_FORMAT = os.getenv("OHLC_EXPORT_FORMAT", "csv")
+
+# Compression codec of the Parquet files
+PARQUET_COMPRESSION = os.getenv("OHLC_PARQUET_COMPRESSION", "zstd")
+
+# File extension of each columnar format
+COLUMNAR_EXTENSIONS = {
+    "parquet": "parquet",
+    "feather": "arrow",
+}
+
+def export_ohlc(df, filename_prefix, timeframe, export_format=OHLC_EXPORT_FORMAT):
+    """
+    Export an OHLC DataFrame (hourly, daily or weekly) in the selected format.
+    - "csv": one file named {filename_prefix}_{timeframe}.csv, as before.
+    - "parquet" / "feather": one file per symbol under {filename_prefix}_{timeframe}/symbol=<SYMBOL>/,
+      a layout that pyarrow.dataset and pandas.read_parquet read as a partitioned dataset.
+      Feather files are written uncompressed so readers can memory-map them.
+    - "none": nothing is written.
+    """
+    if export_format == "none":
+        return
+
+    try:
+        if export_format == "csv":
+            df.to_csv(f"{filename_prefix}_{timeframe}.csv", index=False)
+            print(f"{timeframe.capitalize()} data saved to {filename_prefix}_{timeframe}.csv")
+        elif export_format in COLUMNAR_EXTENSIONS:
+            export_columnar(df, f"{filename_prefix}_{timeframe}", export_format)
+            print(f"{timeframe.capitalize()} data saved to {filename_prefix}_{timeframe}/ ({export_format}, partitioned by symbol)")
+        else:
+            print(f"Unsupported OHLC export format: {export_format}. Skipping export.")
+    except Exception as e:
+        # A failed export must not stop the analysis and the Notion updates
+        print(f"Error exporting {timeframe} data: {e}")
+
+def export_columnar(df, base_dir, export_format):
+    """
+    Write one Parquet or Arrow IPC file per symbol under base_dir/symbol=<SYMBOL>/.
+    """
+    # pyarrow is only needed for the columnar formats
+    import pyarrow as pa
+    import pyarrow.feather as feather
+    import pyarrow.parquet as pq
+
+    # Replace the previous export so symbols dropped from the watchlist do not linger
+    if os.path.isdir(base_dir):
+        shutil.rmtree(base_dir)
+
+    for symbol, group in df.groupby("symbol", sort=False, observed=True):
+        partition_dir = os.path.join(base_dir, f"symbol={symbol}")
+        os.makedirs(partition_dir, exist_ok=True)
+        path = os.path.join(partition_dir, f"part-0.{COLUMNAR_EXTENSIONS[export_format]}")
+
+        table = pa.Table.from_pandas(group.drop(columns="symbol"), preserve_index=False)
+        if export_format == "parquet":
+            pq.write_table(table, path, compression=PARQUET_COMPRESSION)
+        else:
+            feather.write_feather(table, path, compression="uncompressed")
+
+def export_candles(candles_by_timeframe, filename_prefix, export_format=OHLC_EXPORT_FORMAT):
+    """
+    Export per-symbol candle arrays ({timeframe: {symbol: candles}}), one export per timeframe.
+    The DataFrames are only built when an export format is selected.
+    """
+    if export_format == "none":
+        return
+
+    from ohlc_frames import candles_frame
+
+    for timeframe, symbol_candles in candles_by_timeframe.items():
+        df = candles_frame(symbol_candles)
+        if df is not None:
+            export_ohlc(df, filename_prefix, timeframe, export_format)
@@ -0,0 +1,52 @@
+import os
+import numpy as np
+import pandas as pd
+
+# Column order of the hourly, daily and weekly DataFrames
+OHLC_COLUMNS = ["timestamp", "symbol", "open", "high", "low", "close", "volume"]
+
+# Price and volume columns
+VALUE_COLUMNS = ["open", "high", "low", "close", "volume"]
+
+# dtype of the price and volume columns: "float64" (exact) or "float32" (half the memory, ~7 significant digits)
+OHLC_PRICE_DTYPE = os.getenv("OHLC_PRICE_DTYPE", "float64")
+
+def candles_frame(symbol_candles, release=False, price_dtype=OHLC_PRICE_DTYPE):
+    """
+    Combine per-symbol candle arrays (KLINE_DTYPE) into one OHLC DataFrame.
+    Symbols without candles are skipped; returns None if no symbol has any.
+    - The columns are preallocated and filled one symbol at a time, without per-symbol frames.
+    - "symbol" is categorical (one small integer code per row, categories in alphabetical order
+      like a string column would sort), "timestamp" is datetime64[ms] (int64 epoch milliseconds)
+      and the values use `price_dtype`.
+    - release: drop each symbol's array from `symbol_candles` once copied, so the raw candles
+      are freed while the frame is built instead of living alongside it.
+    """
+    symbols = [symbol for symbol, candles in symbol_candles.items() if len(candles)]
+    if not symbols:
+        return None
+
+    total = sum(len(symbol_candles[symbol]) for symbol in symbols)
+    times = np.empty(total, dtype=np.int64)
+    codes = np.empty(total, dtype=np.min_scalar_type(-len(symbols)))  # Smallest signed type holding every code
+    values = {column: np.empty(total, dtype=price_dtype) for column in VALUE_COLUMNS}
+
+    categories = sorted(symbols)
+    category_codes = {symbol: code for code, symbol in enumerate(categories)}
+
+    start = 0
+    for symbol in symbols:
+        candles = symbol_candles.pop(symbol) if release else symbol_candles[symbol]
+        stop = start + len(candles)
+        times[start:stop] = candles["open_time"]
+        codes[start:stop] = category_codes[symbol]
+        for column in VALUE_COLUMNS:
+            values[column][start:stop] = candles[column]
+        start = stop
+        del candles
+
+    return pd.DataFrame({
+        "timestamp": times.view("datetime64[ms]"),
+        "symbol": pd.Categorical.from_codes(codes, categories=categories),
+        **values,
+    }, columns=OHLC_COLUMNS, copy=False)
@@ -0,0 +1,216 @@
+import asyncio
+import os
+import threading
+import time
+from contextlib import asynccontextmanager, contextmanager
+
+# HTTP statuses that mean the caller is being rate limited (418 is Binance's IP ban)
+THROTTLE_STATUSES = (418, 429)
+
+# Statuses retried by every API: throttling and transient server errors (connection failures
+# and timeouts are retried by the HTTP transport, see http_transport.py)
+RETRY_STATUSES = THROTTLE_STATUSES + (500, 502, 503, 504)
+
+# Binance request weight budget per minute and weight of one /api/v3/klines call
+BINANCE_WEIGHT_LIMIT = int(os.getenv("BINANCE_WEIGHT_LIMIT", "6000"))
+BINANCE_MAX_IN_FLIGHT = int(os.getenv("BINANCE_MAX_IN_FLIGHT", "10"))
+KLINES_WEIGHT = 2
+
+# Settings of the shared Binance scheduler, used by both entry points
+BINANCE_LIMITS = {
+    "rate": BINANCE_WEIGHT_LIMIT * 0.8 / 60,  # Weight refilled per second, with a safety margin
+    "burst": BINANCE_WEIGHT_LIMIT * 0.1,
+    "max_in_flight": BINANCE_MAX_IN_FLIGHT,
+    "weight_limit": BINANCE_WEIGHT_LIMIT,
+    "weight_header": "X-MBX-USED-WEIGHT-1M",
+    "retry_statuses": RETRY_STATUSES,
+}
+
+# Notion allows an average of 3 requests per second per integration
+NOTION_MAX_IN_FLIGHT = int(os.getenv("NOTION_MAX_IN_FLIGHT", "3"))
+
+# Settings of the shared Notion scheduler
+NOTION_LIMITS = {
+    "rate": 3,
+    "burst": 3,
+    "max_in_flight": NOTION_MAX_IN_FLIGHT,
+    "retry_statuses": RETRY_STATUSES,
+}
+
+# CoinGecko's free tier allows roughly 30 calls per minute
+COINGECKO_CALLS_PER_MINUTE = float(os.getenv("COINGECKO_CALLS_PER_MINUTE", "30"))
+
+# Settings of the shared CoinGecko scheduler
+COINGECKO_LIMITS = {
+    "rate": COINGECKO_CALLS_PER_MINUTE / 60,
+    "burst": 3,
+    "max_in_flight": 3,
+    "retry_statuses": RETRY_STATUSES,
+}
+
+class TokenBucket:
+    """
+    Token bucket shared by every request sent to one API.
+    - Tokens are refilled continuously at `rate` per second, up to `burst`.
+    - When a used-weight header is available, the bucket pauses until the next minute
+      as soon as the server-side counter approaches `weight_limit`.
+    - Throttled responses (and any other status in `retry_statuses`) block the whole bucket
+      for `Retry-After` seconds, or for an exponential backoff when the header is missing.
+    This class only holds the scheduling state; RateLimiter and AsyncRateLimiter add locking.
+    """
+
+    def __init__(self, rate, burst, max_in_flight=10, weight_limit=None, weight_header=None,
+                 safety=0.9, max_retries=5, backoff_base=1.0, backoff_cap=60.0, retry_statuses=THROTTLE_STATUSES):
+        self.rate = rate
+        self.burst = burst
+        self.max_in_flight = max_in_flight
+        self.weight_limit = weight_limit
+        self.weight_header = weight_header
+        self.safety = safety
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_cap = backoff_cap
+        self.retry_statuses = retry_statuses
+
+        self.tokens = burst
+        self.updated = time.monotonic()
+        self.blocked_until = 0.0
+        self.stats = {"requests": 0, "throttled": 0, "retries": 0, "wait_seconds": 0.0, "used_weight": None}
+
+    def _reserve(self, weight):
+        """
+        Try to take `weight` tokens from the bucket.
+        Returns 0 when the tokens were taken, otherwise the number of seconds to wait.
+        """
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+        if now < self.blocked_until:
+            return self.blocked_until - now
+        if self.tokens >= weight:
+            self.tokens -= weight
+            self.stats["requests"] += 1
+            return 0
+        return (weight - self.tokens) / self.rate
+
+    def _block_for(self, seconds):
+        """
+        Pause every request sharing this bucket for the given number of seconds.
+        """
+        self.blocked_until = max(self.blocked_until, time.monotonic() + seconds)
+
+    def _observe(self, status, headers, attempt):
+        """
+        Update the bucket from a response and tell whether the request should be retried.
+        """
+        # Synchronise with the server-side weight counter
+        if self.weight_header and headers.get(self.weight_header):
+            used = int(headers[self.weight_header])
+            self.stats["used_weight"] = used
+            if self.weight_limit and used >= self.weight_limit * self.safety:
+                # The counter resets at the start of the next minute
+                self._block_for(60 - time.time() % 60)
+
+        if status not in self.retry_statuses:
+            return False
+
+        if status in THROTTLE_STATUSES:
+            self.stats["throttled"] += 1
+        try:
+            self._block_for(float(headers["Retry-After"]))
+        except (KeyError, TypeError, ValueError):
+            # Missing or unparsable header: back off exponentially
+            self._block_for(min(self.backoff_cap, self.backoff_base * 2 ** attempt))
+
+        if attempt >= self.max_retries:
+            return False
+        self.stats["retries"] += 1
+        return True
+
+class RateLimiter(TokenBucket):
+    """
+    Thread-safe token bucket for the synchronous entry point.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._lock = threading.Lock()
+        self._in_flight = threading.Semaphore(self.max_in_flight)
+
+    def acquire(self, weight=1):
+        """
+        Block until `weight` tokens are available.
+        """
+        while True:
+            with self._lock:
+                wait = self._reserve(weight)
+                if not wait:
+                    return
+                self.stats["wait_seconds"] += wait
+            time.sleep(wait)
+
+    @contextmanager
+    def slot(self, weight=1):
+        """
+        Reserve tokens and an in-flight slot for the duration of one request.
+        """
+        with self._in_flight:
+            self.acquire(weight)
+            yield
+
+    def observe(self, status, headers, attempt=0):
+        """
+        Record a response and return True if the request should be retried.
+        """
+        with self._lock:
+            return self._observe(status, headers, attempt)
+
+class AsyncRateLimiter(TokenBucket):
+    """
+    Token bucket for the asyncio entry point.
+    The bucket state is shared by every event loop, but the in-flight semaphore is bound to one,
+    so it is created per running loop (a module-level limiter outlives each asyncio.run).
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._in_flight = None
+        self._in_flight_loop = None
+
+    def _slots(self):
+        """
+        Return the in-flight semaphore of the running event loop, creating it on first use.
+        """
+        loop = asyncio.get_running_loop()
+        if self._in_flight is None or self._in_flight_loop is not loop:
+            self._in_flight = asyncio.Semaphore(self.max_in_flight)
+            self._in_flight_loop = loop
+        return self._in_flight
+
+    async def acquire(self, weight=1):
+        """
+        Wait until `weight` tokens are available.
+        """
+        while True:
+            # No lock is needed: the bucket is only touched from the event loop thread
+            wait = self._reserve(weight)
+            if not wait:
+                return
+            self.stats["wait_seconds"] += wait
+            await asyncio.sleep(wait)
+
+    @asynccontextmanager
+    async def slot(self, weight=1):
+        """
+        Reserve tokens and an in-flight slot for the duration of one request.
+        """
+        async with self._slots():
+            await self.acquire(weight)
+            yield
+
+    def observe(self, status, headers, attempt=0):
+        """
+        Record a response and return True if the request should be retried.
+        """
+        return self._observe(status, headers, attempt)
@@ -0,0 +1,140 @@
+import os
+import time
+import numpy as np
+from kline_store import ARCHIVE_DIR, KLINE_DTYPE, interval_to_ms
+
+# "incremental" maintains the daily/weekly rollups from new candles, "resample" rebuilds them every run
+OHLC_ROLLUP_MODE = os.getenv("OHLC_ROLLUP_MODE", "incremental")
+
+DAY_MS = 86_400_000
+WEEK_MS = 7 * DAY_MS
+
+# Midnight of the first Monday after the epoch (1970-01-05), used to align weekly buckets
+FIRST_MONDAY_MS = 4 * DAY_MS
+
+def daily_labels(open_times):
+    """
+    Label each candle with its daily bucket, like resample("1D"): the start of its UTC day.
+    """
+    return open_times // DAY_MS * DAY_MS
+
+def weekly_labels(open_times):
+    """
+    Label each candle with its weekly bucket, like resample("1W"): weeks run from Monday
+    to Sunday and are labelled with the midnight starting their Sunday.
+    """
+    week_start = FIRST_MONDAY_MS + (open_times - FIRST_MONDAY_MS) // WEEK_MS * WEEK_MS
+    return week_start + 6 * DAY_MS
+
+# Label function of each rollup
+ROLLUPS = {
+    "daily": daily_labels,
+    "weekly": weekly_labels,
+}
+
+def aggregate(candles, labels):
+    """
+    Aggregate time-ordered candles into buckets (first/max/min/last/sum).
+    Returns a KLINE_DTYPE array whose open_time is the bucket label.
+    """
+    if len(candles) == 0:
+        return np.empty(0, dtype=KLINE_DTYPE)
+
+    bucket_labels, starts = np.unique(labels, return_index=True)
+    ends = np.append(starts[1:], len(candles)) - 1
+
+    buckets = np.empty(len(bucket_labels), dtype=KLINE_DTYPE)
+    buckets["open_time"] = bucket_labels
+    buckets["open"] = candles["open"][starts]
+    buckets["high"] = np.maximum.reduceat(candles["high"], starts)
+    buckets["low"] = np.minimum.reduceat(candles["low"], starts)
+    buckets["close"] = candles["close"][ends]
+    buckets["volume"] = np.add.reduceat(candles["volume"], starts)
+    return buckets
+
+def fold(buckets, candles, label_fn):
+    """
+    Fold new time-ordered candles into existing buckets.
+    Only the last existing bucket can change; older buckets are left untouched.
+    """
+    new_buckets = aggregate(candles, label_fn(candles["open_time"]))
+    if len(buckets) == 0 or len(new_buckets) == 0:
+        return np.concatenate([buckets, new_buckets])
+
+    if buckets["open_time"][-1] != new_buckets["open_time"][0]:
+        return np.concatenate([buckets, new_buckets])
+
+    # The first new bucket continues the last existing one
+    merged = np.concatenate([buckets, new_buckets[1:]])
+    last = len(buckets) - 1
+    first = new_buckets[0]
+    merged["high"][last] = max(merged["high"][last], first["high"])
+    merged["low"][last] = min(merged["low"][last], first["low"])
+    merged["close"][last] = first["close"]
+    merged["volume"][last] += first["volume"]
+    return merged
+
+def rollup_path(symbol, interval, archive_dir=ARCHIVE_DIR):
+    """
+    Return the path of the rollup file of a symbol, stored next to its candle archive.
+    """
+    return os.path.join(archive_dir, f"{symbol}_{interval}_rollups.npz")
+
+def load_rollups(symbol, interval, archive_dir=ARCHIVE_DIR):
+    """
+    Load the stored rollups of a symbol and the open time of the last candle folded into them.
+    Returns (None, {}) when no usable rollup file exists.
+    """
+    try:
+        with np.load(rollup_path(symbol, interval, archive_dir)) as stored:
+            return int(stored["last_folded"]), {name: stored[name] for name in ROLLUPS}
+    except (OSError, KeyError, ValueError):
+        return None, {}
+
+def save_rollups(symbol, interval, last_folded, rollups, archive_dir=ARCHIVE_DIR):
+    """
+    Persist the rollups of a symbol, replacing the previous file atomically.
+    """
+    os.makedirs(archive_dir, exist_ok=True)
+    path = rollup_path(symbol, interval, archive_dir)
+    tmp_path = f"{path}.tmp.npz"
+    np.savez(tmp_path, last_folded=np.int64(last_folded), **rollups)
+    os.replace(tmp_path, path)
+
+def update_rollups(symbol, candles, window_start, interval="1h", archive_dir=ARCHIVE_DIR, now_ms=None):
+    """
+    Maintain the daily and weekly rollups of a symbol from its candles.
+    - Closed candles newer than the last folded one update only the affected buckets; the result is persisted.
+    - The live candle is folded into a copy, so it is never persisted.
+    - The rollups are rebuilt from the candles when missing or when the data no longer covers
+      the last folded candle.
+    - Buckets that end before the window start are dropped.
+    Returns a dictionary with the "daily" and "weekly" KLINE_DTYPE arrays.
+    """
+    if now_ms is None:
+        now_ms = int(time.time() * 1000)
+
+    interval_ms = interval_to_ms(interval)
+    closed_mask = candles["open_time"] + interval_ms <= now_ms
+    closed = candles[closed_mask]
+    live = candles[~closed_mask]
+
+    last_folded, rollups = load_rollups(symbol, interval, archive_dir)
+    valid = last_folded is not None and (len(closed) == 0 or closed["open_time"][0] <= last_folded)
+    if not valid:
+        # Rebuild every bucket from the available candles
+        rollups = {name: np.empty(0, dtype=KLINE_DTYPE) for name in ROLLUPS}
+        last_folded = None
+
+    new = closed if last_folded is None else closed[closed["open_time"] > last_folded]
+    if len(new) or not valid:
+        for name, label_fn in ROLLUPS.items():
+            buckets = fold(rollups[name], new, label_fn)
+            # Keep the buckets that still hold candles of the window
+            first_label = label_fn(np.array([window_start], dtype=np.int64))[0]
+            rollups[name] = buckets[buckets["open_time"] >= first_label]
+        if len(closed):
+            last_folded = int(closed["open_time"][-1])
+            save_rollups(symbol, interval, last_folded, rollups, archive_dir)
+
+    return {name: fold(rollups[name], live, label_fn) for name, label_fn in ROLLUPS.items()}
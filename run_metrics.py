@@ -0,0 +1,169 @@
+import json
+import math
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+# Output of the run metrics: "json", "prometheus" (node_exporter textfile) or "none"
+RUN_METRICS_FORMAT = os.getenv("RUN_METRICS_FORMAT", "json")
+
+# File the metrics are written to at the end of the run
+RUN_METRICS_PATH = os.getenv("RUN_METRICS_PATH", "run_metrics.prom" if RUN_METRICS_FORMAT == "prometheus" else "run_metrics.json")
+
+# Limiter counters copied into the stage that used the limiter
+LIMITER_COUNTERS = ("requests", "throttled", "retries", "wait_seconds")
+
+# Quantiles reported for the per-symbol latencies
+LATENCY_QUANTILES = (0.5, 0.9, 0.99)
+
+def quantile(sorted_values, q):
+    """
+    Nearest-rank quantile of an already sorted list.
+    """
+    return sorted_values[max(0, math.ceil(q * len(sorted_values)) - 1)]
+
+class RunMetrics:
+    """
+    Per-stage instrumentation of one pipeline run.
+    - stage(): context manager recording the wall time of a stage and, when a rate limiter
+      is given, the requests, 429s, retries and waits it accumulated during the stage.
+      With timed=False only the limiter counters are kept, for stages running inside another
+      one whose wall time is recorded instead (e.g. the pipelined streaming phase).
+    - sample(): context manager recording the duration of a block as one latency sample, for work
+      running concurrently (e.g. the analysis of each symbol), where summed durations would overlap.
+    - count(): add to a stage counter (e.g. "bytes", "pages").
+    - count_since(): add the increase of external counters, e.g. the connections of the HTTP transport.
+    - observe(): record one latency sample (e.g. the fetch time of a symbol).
+    Counters are protected by a lock, since the sync entry point records from worker threads.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        """
+        Clear every stage, e.g. before the next run of a long-lived process.
+        """
+        with self._lock:
+            self.started = time.time()
+            self.stages = {}
+            self.latencies = {}
+
+    def _stage(self, name):
+        return self.stages.setdefault(name, {})
+
+    @contextmanager
+    def stage(self, name, limiter=None, timed=True):
+        before = dict(limiter.stats) if limiter else None
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            with self._lock:
+                stage = self._stage(name)
+                if timed:
+                    stage["seconds"] = stage.get("seconds", 0.0) + elapsed
+                if limiter:
+                    for key in LIMITER_COUNTERS:
+                        stage[key] = stage.get(key, 0) + limiter.stats[key] - before[key]
+
+    def count(self, name, key, value=1):
+        with self._lock:
+            stage = self._stage(name)
+            stage[key] = stage.get(key, 0) + value
+
+    def count_since(self, name, before, after):
+        """
+        Add the increase of external, ever-growing counters to a stage (e.g. the HTTP connections).
+        """
+        with self._lock:
+            stage = self._stage(name)
+            for key, value in after.items():
+                stage[key] = stage.get(key, 0) + value - before.get(key, 0)
+
+    def observe(self, name, seconds):
+        with self._lock:
+            self.latencies.setdefault(name, []).append(seconds)
+
+    @contextmanager
+    def sample(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start)
+
+    def snapshot(self):
+        """
+        Return the metrics as a dictionary, with latency quantiles summarized per stage.
+        """
+        with self._lock:
+            stages = {name: dict(stage) for name, stage in self.stages.items()}
+            for name, samples in self.latencies.items():
+                ordered = sorted(samples)
+                latency = {"count": len(ordered), "sum": sum(ordered), "max": ordered[-1]}
+                latency.update({f"p{int(q * 100)}": quantile(ordered, q) for q in LATENCY_QUANTILES})
+                stages.setdefault(name, {})["latency"] = latency
+
+        return {
+            "started_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime(self.started)),
+            "total_seconds": round(time.time() - self.started, 3),
+            "stages": stages,
+        }
+
+    def write(self, path=RUN_METRICS_PATH, output_format=RUN_METRICS_FORMAT):
+        """
+        Write the metrics as JSON or as a Prometheus textfile, replacing the previous file atomically.
+        """
+        if output_format == "none":
+            return
+
+        try:
+            snapshot = self.snapshot()
+            if output_format == "prometheus":
+                content = prometheus_text(snapshot, self.started)
+            else:
+                content = json.dumps(snapshot, indent=4)
+
+            tmp_path = f"{path}.tmp"
+            with open(tmp_path, "w") as f:
+                f.write(content)
+            os.replace(tmp_path, path)
+            print(f"Run metrics saved to {path}")
+        except OSError as e:
+            print(f"Error saving run metrics: {e}")
+
+def prometheus_text(snapshot, started):
+    """
+    Render a metrics snapshot in the Prometheus text exposition format.
+    """
+    lines = [
+        "# HELP portfolio_run_seconds Wall time of the whole run.",
+        "# TYPE portfolio_run_seconds gauge",
+        f"portfolio_run_seconds {snapshot['total_seconds']}",
+        "# HELP portfolio_run_timestamp_seconds Start time of the run.",
+        "# TYPE portfolio_run_timestamp_seconds gauge",
+        f"portfolio_run_timestamp_seconds {started:.0f}",
+    ]
+
+    # One gauge per stage counter, e.g. portfolio_stage_seconds{stage="binance"}
+    keys = sorted({key for stage in snapshot["stages"].values() for key in stage if key != "latency"})
+    for key in keys:
+        lines.append(f"# TYPE portfolio_stage_{key} gauge")
+        for name, stage in snapshot["stages"].items():
+            if key in stage:
+                lines.append(f'portfolio_stage_{key}{{stage="{name}"}} {stage[key]}')
+
+    lines.append("# TYPE portfolio_stage_latency_seconds summary")
+    for name, stage in snapshot["stages"].items():
+        latency = stage.get("latency")
+        if not latency:
+            continue
+        for q in LATENCY_QUANTILES:
+            lines.append(f'portfolio_stage_latency_seconds{{stage="{name}",quantile="{q}"}} {latency[f"p{int(q * 100)}"]}')
+        lines.append(f'portfolio_stage_latency_seconds_sum{{stage="{name}"}} {latency["sum"]}')
+        lines.append(f'portfolio_stage_latency_seconds_count{{stage="{name}"}} {latency["count"]}')
+    return "\n".join(lines) + "\n"
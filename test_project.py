@@ -0,0 +1,523 @@
+import app_async
+import asyncio
+import json
+import math
+import numpy as np
+import os
+import pandas as pd
+import pytest
+import socket
+import time
+from aiohttp import web
+from aiohttp.test_utils import TestClient, TestServer
+from app import analyze_momentum, analyze_trend, filter_for_coingecko
+from benchmark import compare
+from daemon import run_once, status_handler
+from fake_services import run_entry_point
+from indicator_state import load_state, save_state, update_indicators
+from indicators import compute_indicators
+from kline_parser import decode_stream_kline, loads
+from kline_planner import lookback_days, merge_kline_pages, plan_kline_windows
+from kline_store import (KLINE_DTYPE, interval_to_ms, load_candles, load_first_open, merge_and_persist,
+                         next_start_time)
+from kline_stream import handle_message
+from market_cache import chunk_ids, load_cached_markets
+from notion_diff import diff_properties, numbers_equal
+from notion_snapshot import apply_sync, incremental_filter, open_snapshot
+from ohlc_frames import candles_frame
+from rate_limit import AsyncRateLimiter
+from rollups import update_rollups
+from run_metrics import RunMetrics, prometheus_text
+from types import SimpleNamespace
+
+HOUR_MS = interval_to_ms("1h")
+
+def make_candles(first_open, count, interval_ms=HOUR_MS, seed=0):
+    """
+    Build `count` consecutive KLINE_DTYPE candles with a random walk of prices.
+    """
+    rng = np.random.default_rng(seed)
+    closes = 100 + np.cumsum(rng.normal(0, 1, count))
+    candles = np.empty(count, dtype=KLINE_DTYPE)
+    candles["open_time"] = first_open + np.arange(count, dtype=np.int64) * interval_ms
+    candles["open"] = np.concatenate([[100.0], closes[:-1]])
+    candles["high"] = np.maximum(candles["open"], closes) + rng.uniform(0, 1, count)
+    candles["low"] = np.minimum(candles["open"], closes) - rng.uniform(0, 1, count)
+    candles["close"] = closes
+    candles["volume"] = rng.uniform(1, 10, count)
+    return candles
+
+# Trend, momentum and watchlist filtering
+
+def test_analyze_trend():
+    assert analyze_trend(pd.DataFrame({"close": np.arange(1, 101, dtype=float)})) == {"trend": "Bullish"}
+    assert analyze_trend(pd.DataFrame({"close": np.arange(100, 0, -1, dtype=float)})) == {"trend": "Bearish"}
+    assert analyze_trend(pd.DataFrame({"close": np.full(100, 5.0)})) == {"trend": "Range"}
+
+def test_analyze_momentum():
+    rising = analyze_momentum(pd.DataFrame({"close": np.arange(1, 101, dtype=float)}))
+    assert rising["overview"] == "RSI: Overbought MACD: Bullish"
+
+    falling = analyze_momentum(pd.DataFrame({"close": np.arange(100, 0, -1, dtype=float)}))
+    assert falling["overview"] == "RSI: Oversold MACD: Bearish"
+
+    spike = analyze_momentum(pd.DataFrame({"close": np.append(np.full(99, 100.0), 150.0)}))
+    assert spike["RSI"] == 100
+    assert spike["overview"] == "RSI: Overbought MACD: Bullish"
+
+def test_filter_for_coingecko(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)  # The filtered list is saved to the working directory
+
+    def entry(page_id, watchlisted, coingecko_id):
+        return {"id": page_id, "properties": {
+            "Symbol": {"title": [{"text": {"content": page_id.upper()}}]},
+            "Watchlist General": {"formula": {"boolean": watchlisted}},
+            "ID API Coingecko": {"rich_text": [{"text": {"content": coingecko_id}}] if coingecko_id else [{}]},
+        }}
+
+    entries = [entry("btc", True, "bitcoin"), entry("eth", False, "ethereum"), entry("sol", True, None)]
+    assert filter_for_coingecko(entries) == [{"id": "btc", "symbol": "BTC", "coingecko_id": "bitcoin"}]
+    assert filter_for_coingecko([]) == []
+
+
+# Local candle archive
+
+def test_next_start_time_resumes_after_the_last_stored_candle():
+    stored = make_candles(100 * HOUR_MS, 50)
+    assert next_start_time(stored, "1h", 100 * HOUR_MS) == 150 * HOUR_MS
+
+def test_next_start_time_restarts_missing_or_stale_archives():
+    window_start = 100 * HOUR_MS
+    assert next_start_time(np.empty(0, dtype=KLINE_DTYPE), "1h", window_start) == window_start
+    assert next_start_time(make_candles(0, 50), "1h", window_start) == window_start  # Older than the window
+    assert next_start_time(make_candles(120 * HOUR_MS, 50), "1h", window_start) == window_start  # Too short
+
+def test_next_start_time_accepts_an_archive_starting_at_the_listing():
+    stored = make_candles(120 * HOUR_MS, 50)
+    assert next_start_time(stored, "1h", 100 * HOUR_MS, first_available=120 * HOUR_MS) == 170 * HOUR_MS
+
+def test_merge_and_persist_appends_closed_candles_only(tmp_path):
+    candles = make_candles(100 * HOUR_MS, 50)
+    now_ms = 149 * HOUR_MS + 1  # The last candle is still open
+
+    window = merge_and_persist("BTCUSDT", "1h", load_candles("BTCUSDT", "1h", tmp_path), candles,
+                               100 * HOUR_MS, tmp_path, now_ms=now_ms)
+    assert len(window) == 50
+    stored = load_candles("BTCUSDT", "1h", tmp_path)
+    assert len(stored) == 49
+
+    # The next run fetches from the live candle onwards and only appends what closed since
+    update = make_candles(149 * HOUR_MS, 3, seed=1)
+    window = merge_and_persist("BTCUSDT", "1h", stored, update, 101 * HOUR_MS, tmp_path, now_ms=151 * HOUR_MS + 1)
+    stored = load_candles("BTCUSDT", "1h", tmp_path)
+    assert list(stored["open_time"]) == list(range(100 * HOUR_MS, 151 * HOUR_MS, HOUR_MS))
+    assert window["open_time"][0] == 101 * HOUR_MS
+    assert window["open_time"][-1] == 151 * HOUR_MS
+
+def test_merge_and_persist_resumes_symbols_younger_than_the_window(tmp_path):
+    window_start = 100 * HOUR_MS
+    listing = 500 * HOUR_MS
+    candles = make_candles(listing, 20)
+
+    merge_and_persist("NEWUSDT", "1h", load_candles("NEWUSDT", "1h", tmp_path), candles, window_start, tmp_path,
+                      now_ms=520 * HOUR_MS)
+    first_available = load_first_open("NEWUSDT", "1h", tmp_path)
+    assert first_available == listing
+
+    stored = load_candles("NEWUSDT", "1h", tmp_path)
+    assert next_start_time(stored, "1h", window_start + HOUR_MS, first_available) == 520 * HOUR_MS
+
+# Rate limiting
+
+def test_retry_after_blocks_the_async_limiter():
+    limiter = AsyncRateLimiter(rate=1000, burst=10, max_in_flight=2)
+
+    async def throttled_then_retried():
+        async with limiter.slot():
+            retry = limiter.observe(429, {"Retry-After": "0.2"})
+        start = time.monotonic()
+        async with limiter.slot():
+            return retry, time.monotonic() - start
+
+    retry, waited = asyncio.run(throttled_then_retried())
+    assert retry
+    assert waited >= 0.15
+    assert limiter.stats["throttled"] == 1
+    assert limiter.stats["retries"] == 1
+    assert not limiter.observe(200, {})
+
+def test_async_limiter_survives_a_new_event_loop():
+    limiter = AsyncRateLimiter(rate=1000, burst=10, max_in_flight=1)
+
+    async def requests():
+        async def request():
+            async with limiter.slot():
+                await asyncio.sleep(0.01)
+        await asyncio.gather(request(), request())
+
+    # The module-level limiters of app_async.py are reused by every asyncio.run (CLI, daemon, tests)
+    asyncio.run(requests())
+    asyncio.run(requests())
+    assert limiter.stats["requests"] == 4
+
+# Window planner
+
+def test_plan_kline_windows_covers_the_period_without_overlap():
+    start = 1_000 * HOUR_MS
+    end = start + 2_500 * HOUR_MS
+    windows = plan_kline_windows(start, "1h", end_time=end, limit=1000)
+
+    assert windows[0][0] == start
+    assert windows[-1][1] == end
+    for (_, previous_end), (next_start, _) in zip(windows, windows[1:]):
+        assert next_start == previous_end + 1
+    for window_start, window_end in windows:
+        assert (window_end - window_start) // HOUR_MS + 1 <= 1000
+
+def test_plan_kline_windows_is_empty_when_up_to_date():
+    assert plan_kline_windows(2_000, "1h", end_time=1_000) == []
+
+def test_lookback_days_rounds_up():
+    assert lookback_days("1d", bars=500) == 500
+    assert lookback_days("1h", bars=25) == 2
+
+
+def test_merge_kline_pages_sorts_and_drops_duplicates():
+    candles = make_candles(0, 10)
+    merged = merge_kline_pages([candles[5:], candles[:6]])
+    assert list(merged["open_time"]) == list(candles["open_time"])
+    assert len(merge_kline_pages([])) == 0
+
+
+# Notion diff
+
+def test_numbers_equal_uses_the_relative_tolerance():
+    assert numbers_equal(100.0, 100.0 + 1e-5, rel_tol=1e-6)
+    assert not numbers_equal(100.0, 100.01, rel_tol=1e-6)
+    assert numbers_equal(None, None)
+    assert not numbers_equal(None, 0)
+
+def test_diff_properties_keeps_changed_values_only():
+    page = {
+        "Price": {"number": 100.0},
+        "Market Cap": {"number": 2_000.0},
+        "Short Term Trend": {"select": {"name": "Bullish"}},
+        "Long Term Trend": {"select": None},
+    }
+    updated = {
+        "Price": {"number": 100.00000001},
+        "Market Cap": {"number": 2_100.0},
+        "Short Term Trend": {"select": {"name": "Bullish"}},
+        "Long Term Trend": {"select": {"name": "Range"}},
+        "Volume": {"number": 5.0},
+    }
+    assert set(diff_properties(page, updated)) == {"Market Cap", "Long Term Trend", "Volume"}
+
+# Notion snapshot
+
+def page(page_id, edited, **extra):
+    return {"id": page_id, "last_edited_time": edited, "properties": {}, **extra}
+
+def test_snapshot_sync(tmp_path):
+    conn = open_snapshot(tmp_path / "snapshot.sqlite")
+    assert incremental_filter(conn, "db") is None  # No snapshot yet: full pass
+
+    pages = apply_sync(conn, "db", [page("a", "2026-01-01T00:00:00.000Z"), page("b", "2026-01-02T00:00:00.000Z")],
+                       full=True)
+    assert [p["id"] for p in pages] == ["a", "b"]
+    assert incremental_filter(conn, "db") == {
+        "timestamp": "last_edited_time", "last_edited_time": {"on_or_after": "2026-01-02T00:00:00.000Z"}
+    }
+
+    # Incremental pass: "a" is edited, "b" is archived, "c" is new
+    pages = apply_sync(conn, "db", [
+        page("a", "2026-01-03T00:00:00.000Z", properties={"Price": {"number": 1}}),
+        page("b", "2026-01-03T00:00:00.000Z", archived=True),
+        page("c", "2026-01-03T00:00:00.000Z"),
+    ], full=False)
+    assert [p["id"] for p in pages] == ["a", "c"]
+    assert pages[0]["properties"] == {"Price": {"number": 1}}
+
+    # A full pass drops the pages it did not return
+    pages = apply_sync(conn, "db", [page("c", "2026-01-03T00:00:00.000Z")], full=True)
+    assert [p["id"] for p in pages] == ["c"]
+    assert incremental_filter(conn, "db", full_sync_hours=0) is None  # Full pass due
+    conn.close()
+
+# CoinGecko chunks
+
+def test_chunk_ids_respects_the_page_size():
+    ids = [f"coin-{i}" for i in range(600)]
+    chunks = chunk_ids(ids, size=250)
+    assert [len(chunk) for chunk in chunks] == [250, 250, 100]
+    assert [coin_id for chunk in chunks for coin_id in chunk] == ids
+
+def test_chunk_ids_respects_the_url_length_and_drops_duplicates():
+    ids = ["a" * 9] * 3 + ["b" * 9, "c" * 9, "d" * 9]
+    chunks = chunk_ids(ids, size=250, max_length=25)
+    assert chunks == [["a" * 9, "b" * 9], ["c" * 9, "d" * 9]]
+    assert all(len(",".join(chunk)) <= 25 for chunk in chunks)
+
+def test_coingecko_keeps_the_chunks_fetched_before_a_failure(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)  # The market cache and the fetched data are saved to the working directory
+
+    async def fetch_chunk(session, url, params):
+        if params["ids"] == "ethereum":
+            raise ValueError("bad page")
+        return [{"id": coin_id, "current_price": 1.0, "market_cap": 2.0, "total_volume": 3.0,
+                 "price_change_percentage_24h": 0.1} for coin_id in params["ids"].split(",")]
+
+    monkeypatch.setattr(app_async, "chunk_ids", lambda ids: [[coin_id] for coin_id in ids])
+    monkeypatch.setattr(app_async, "fetch_coingecko_chunk", fetch_chunk)
+    monkeypatch.setattr(app_async, "get_async_session", lambda: None)
+
+    ids = ["bitcoin", "ethereum", "solana"]
+    general_data = asyncio.run(app_async.fetch_general_data_coingecko(ids))
+    assert set(general_data) == {"bitcoin", "solana"}
+
+    # The successful chunks were cached: only the failed id is fetched again
+    assert load_cached_markets(ids)[1] == ["ethereum"]
+
+# Incremental indicator state
+
+def closes_frame(symbol_closes):
+    """
+    OHLC-like DataFrame with the "timestamp", "symbol" and "close" columns read by the indicators.
+    """
+    frames = [
+        pd.DataFrame({
+            "timestamp": pd.to_datetime(np.arange(len(closes)) * HOUR_MS, unit="ms"),
+            "symbol": symbol,
+            "close": closes,
+        })
+        for symbol, closes in symbol_closes.items()
+    ]
+    return pd.concat(frames, ignore_index=True)
+
+def test_incremental_indicators_match_full_recompute():
+    rng = np.random.default_rng(1)
+    symbol_closes = {symbol: 100 + np.cumsum(rng.normal(0, 1, 300)) for symbol in ["BTCUSDT", "ETHUSDT"]}
+    symbol_closes["NEWUSDT"] = 10 + np.cumsum(rng.normal(0, 1, 12))  # Too short for MA50 and the RSI tail
+
+    # Build the state from part of the history, then update it with the rest
+    states = {}
+    update_indicators(closes_frame({symbol: closes[:-40] for symbol, closes in symbol_closes.items()}), "short", states)
+    incremental = update_indicators(closes_frame(symbol_closes), "short", states)
+    full = compute_indicators(closes_frame(symbol_closes))
+
+    for symbol in symbol_closes:
+        for column in ["MA10", "MA50", "RSI", "MACD Line", "Signal Line"]:
+            expected = full.loc[symbol, column]
+            actual = incremental.loc[symbol, column]
+            if math.isnan(expected):
+                assert math.isnan(actual)
+            else:
+                assert actual == pytest.approx(expected, rel=1e-9)
+        assert incremental.loc[symbol, "trend"] == full.loc[symbol, "trend"]
+        assert incremental.loc[symbol, "overview"] == full.loc[symbol, "overview"]
+
+def test_incremental_indicators_skip_missing_closes():
+    rng = np.random.default_rng(2)
+    closes = 100 + np.cumsum(rng.normal(0, 1, 200))
+    closes[170:173] = np.nan  # Gap in the candles applied incrementally
+
+    states = {}
+    update_indicators(closes_frame({"BTCUSDT": closes[:150]}), "short", states)
+    incremental = update_indicators(closes_frame({"BTCUSDT": closes}), "short", states)
+    rebuilt = update_indicators(closes_frame({"BTCUSDT": closes}), "short", {})
+    full = compute_indicators(closes_frame({"BTCUSDT": closes}).dropna())
+
+    assert math.isfinite(states["short:BTCUSDT"]["ema12"])
+    assert states["short:BTCUSDT"]["count"] == 196  # 199 closed candles, 3 of them missing
+    for column in ["MA10", "MA50", "RSI", "MACD Line", "Signal Line"]:
+        assert incremental.loc["BTCUSDT", column] == pytest.approx(full.loc["BTCUSDT", column], rel=1e-9)
+        assert rebuilt.loc["BTCUSDT", column] == pytest.approx(full.loc["BTCUSDT", column], rel=1e-9)
+
+# Incremental rollups
+
+def resample(candles, rule):
+    """
+    Daily or weekly bars of one symbol's hourly candles, as in the "resample" rollup mode.
+    """
+    frame = candles_frame({"BTCUSDT": candles}).set_index("timestamp")
+    bars = frame.resample(rule).agg({"open": "first", "high": "max", "low": "min", "close": "last", "volume": "sum"})
+    return bars.dropna()
+
+@pytest.mark.parametrize("name, rule", [("daily", "1D"), ("weekly", "1W")])
+def test_incremental_rollups_match_resample(tmp_path, name, rule):
+    # 40 days of hourly candles starting on a Wednesday afternoon, folded in four runs
+    first_open = 19_725 * 86_400_000 + 15 * HOUR_MS
+    candles = make_candles(first_open, 40 * 24)
+    now_ms = int(candles["open_time"][-1]) + HOUR_MS // 2  # The last candle is still open
+
+    for end in (300, 301, 700, len(candles)):
+        rollups = update_rollups("BTCUSDT", candles[:end], first_open, archive_dir=tmp_path, now_ms=now_ms)
+
+    expected = resample(candles, rule)
+    bars = rollups[name]
+    assert list(bars["open_time"]) == list(expected.index.to_numpy().astype("datetime64[ms]").astype(np.int64))
+    for column in ["open", "high", "low", "close", "volume"]:
+        np.testing.assert_allclose(bars[column], expected[column].to_numpy())
+
+# Benchmark regressions
+
+def test_compare_reports_cases_slower_than_the_tolerance(tmp_path):
+    baseline = tmp_path / "baseline.json"
+    baseline.write_text(json.dumps({"results": [
+        {"module": "app", "case": "analyze_trend", "symbols": 10, "seconds": 1.0},
+        {"module": "app", "case": "analyze_momentum", "symbols": 10, "seconds": 1.0},
+    ]}))
+    results = [
+        {"module": "app", "case": "analyze_trend", "symbols": 10, "seconds": 1.2},
+        {"module": "app", "case": "analyze_momentum", "symbols": 10, "seconds": 1.5},
+        {"module": "app", "case": "analyze_momentum", "symbols": 100, "seconds": 9.0},  # Not in the baseline
+    ]
+    assert compare(results, baseline, 1.25) == [(results[1], 1.0)]
+
+# Run metrics
+
+def test_overlapping_stages_are_not_summed():
+    metrics = RunMetrics()
+    with metrics.stage("streaming"), metrics.stage("binance", timed=False):
+        for _ in range(3):
+            with metrics.sample("analysis"):
+                pass
+
+    stages = metrics.snapshot()["stages"]
+    assert "seconds" in stages["streaming"]
+    assert "seconds" not in stages["binance"]
+    assert "seconds" not in stages["analysis"]
+    assert stages["analysis"]["latency"]["count"] == 3
+
+    text = prometheus_text(metrics.snapshot(), metrics.started)
+    assert 'portfolio_stage_seconds{stage="streaming"}' in text
+    assert 'portfolio_stage_seconds{stage="analysis"}' not in text
+    assert 'portfolio_stage_latency_seconds_count{stage="analysis"} 3' in text
+
+# Pipelined async entry point
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+def test_pipelined_entries_are_written_concurrently(monkeypatch):
+    in_flight = 0
+    peak = 0
+
+    async def update_page(page_id, properties):
+        nonlocal in_flight, peak
+        in_flight += 1
+        peak = max(peak, in_flight)
+        await asyncio.sleep(0.05)
+        in_flight -= 1
+        return True
+
+    monkeypatch.setattr(app_async, "build_entry_update", lambda entry, general_data, tables: {"Price": {"number": 1}})
+    monkeypatch.setattr(app_async, "update_security_entry", update_page)
+
+    async def update_other_entries():
+        coingecko_task = asyncio.get_running_loop().create_future()
+        coingecko_task.set_result({})
+        results = []
+        await app_async.update_entries([{"id": f"page-{i}"} for i in range(6)], coingecko_task, None, results)
+        return results
+
+    results = asyncio.run(update_other_entries())
+    assert sorted(page_id for page_id, _ in results) == [f"page-{i}" for i in range(6)]
+    assert peak >= 2
+    assert peak <= app_async.notion_limiter.max_in_flight
+
+def test_pipelined_main_updates_every_page(monkeypatch):
+    monkeypatch.setenv("ASYNC_MAIN_MODE", "pipelined")
+    run = run_entry_point("app_async.py", {"pages": 4, "latency": 0.0}, port=free_port())
+    assert run["exit_code"] == 0
+    assert run["requests"]["pages"]["updated"] == 4
+    assert run["requests"]["klines"]["failed"] == 0
+
+# Resident daemon
+
+def test_health_reports_failed_runs():
+    async def failed_run():
+        return False
+
+    app = SimpleNamespace(main=failed_run, run_metrics=RunMetrics())
+    status = {"app": "app_async", "state": "idle", "runs": 0, "failures": 0, "started": time.time(),
+              "last_started": None, "last_finished": None, "last_success": None, "last_error": None,
+              "next_run": None, "last_metrics": None}
+
+    async def check_health():
+        await run_once(app, status)
+        health = web.Application()
+        health.add_routes([web.get("/health", status_handler(status, "1h"))])
+        async with TestClient(TestServer(health)) as client:
+            response = await client.get("/health")
+            body = await response.json()
+            assert response.status == 200  # Started less than two intervals ago
+            assert body["runs"] == 1
+            assert body["failures"] == 1
+            assert body["last_error"] == "Run did not complete, see the log for details"
+
+            status["started"] -= 3 * 3600  # No successful run for three intervals
+            response = await client.get("/health")
+            assert response.status == 503
+            assert not (await response.json())["healthy"]
+
+    asyncio.run(check_health())
+
+def test_snapshot_pages_stay_decoded_until_another_connection_writes(tmp_path):
+    path = tmp_path / "snapshot.sqlite"
+    conn = open_snapshot(path)
+    apply_sync(conn, "db", [page("a", "2026-01-01T00:00:00.000Z"), page("b", "2026-01-02T00:00:00.000Z")],
+               full=True)
+    pages = apply_sync(conn, "db", [page("a", "2026-01-03T00:00:00.000Z")], full=False)
+    assert [p["id"] for p in pages] == ["b", "a"]  # Same order as the rows read back from SQLite
+
+    other = open_snapshot(path)
+    assert apply_sync(other, "db", [], full=False) == pages
+    apply_sync(other, "db", [page("c", "2026-01-04T00:00:00.000Z")], full=False)
+    other.close()
+
+    # The write from the other connection invalidates the decoded pages
+    assert [p["id"] for p in apply_sync(conn, "db", [], full=False)] == ["b", "a", "c"]
+    conn.close()
+
+def test_indicator_state_is_reused_while_the_file_is_unchanged(tmp_path):
+    path = str(tmp_path / "indicator_state.json")
+    states = {"short:BTCUSDT": {"last_time": 1, "count": 0, "ema12": 0.0, "ema26": 0.0, "signal": 0.0,
+                                "closes": []}}
+    save_state(states, path)
+    assert load_state(path) is states
+
+    # Another process replaced the file: it is read again
+    with open(path, "w") as f:
+        json.dump({"version": 1, "states": {}}, f)
+    os.utime(path, ns=(0, 0))
+    assert load_state(path) == {}
+
+# Kline streams
+
+def kline_message(closed, symbol="BTCUSDT"):
+    return json.dumps({"stream": f"{symbol.lower()}@kline_1h", "data": {"e": "kline", "E": 1, "s": symbol, "k": {
+        "t": 100 * HOUR_MS, "T": 101 * HOUR_MS - 1, "s": symbol, "i": "1h", "o": "101.5", "c": "103.25",
+        "h": "104.0", "l": "100.75", "v": "1234.5", "x": closed,
+    }}})
+
+def test_decode_stream_kline():
+    candle = decode_stream_kline(loads(kline_message(closed=True))["data"]["k"])
+    assert candle.dtype == KLINE_DTYPE
+    assert len(candle) == 1
+    assert candle["open_time"][0] == 100 * HOUR_MS
+    assert (candle["open"][0], candle["high"][0], candle["low"][0], candle["close"][0], candle["volume"][0]) == (
+        101.5, 104.0, 100.75, 103.25, 1234.5)
+
+def test_stream_ignores_open_unknown_and_replayed_candles():
+    series = {"hourly": make_candles(60 * HOUR_MS, 50)}  # Already holds the 100th hour
+    stream = {"intervals": {"1h": "hourly"}, "series": {"BTCUSDT": series}, "gaps": set(), "pending": set()}
+
+    handle_message(stream, loads(kline_message(closed=False)))
+    handle_message(stream, loads(kline_message(closed=True, symbol="XYZUSDT")))
+    handle_message(stream, loads(kline_message(closed=True)))  # Replayed after a reconnect
+    assert len(series["hourly"]) == 50
+    assert stream["gaps"] == set()
+    assert stream["pending"] == set()